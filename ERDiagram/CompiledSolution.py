@@ -0,0 +1,288 @@
+from erdiagram.NodeType import NodeType
+from erdiagram.ERObject import ERObject
+from erdiagram.Similarity import Similarity
+from collections.abc import Mapping
+import hashlib
+import json
+
+class CompiledSolution:
+    '''
+        Snapshot of a solution ER diagram prepared for grading many submissions.
+        Everything compareGraphs derives from the solution and the scores is computed once:
+        the objects to check, the attributes of each entity, the property keys and the
+        resolved scores per NodeType.
+        Changes to the solution after compiling are not reflected.
+    '''
+
+    # property keys to compare per NodeType
+    PROPERTY_KEYS = {
+        str(NodeType.NODE): ('isMultiple', 'isWeak'),
+        str(NodeType.ATTRIBUTE): ('attrLabel', 'parentLabel', 'isPK', 'isMultiple', 'isWeak', 'composedOf'),
+        str(NodeType.COMPOSED_ATTRIBUTE): ('attrLabel', 'parentLabel', 'isPK', 'isMultiple', 'isWeak', 'composedOf'),
+        str(NodeType.IS_A): ('relation', 'superClassLabel', 'superLabel', 'subLabel', 'isDisjunct', 'subClasses'),
+        str(NodeType.RELATION): ('relationFrom', 'relationTo', 'fromEdgeLabel', 'toEdgeLabel', 'isWeak')
+    }
+
+    def __init__(self, solution, scores, label="", node_type=NodeType.NOT_SPECIFIED):
+        '''
+        constructor
+
+        Args:
+            solution(ER): the solution diagram
+            scores(dict): the scores to grade with
+            label(str): only grade objects matching this label, see ER.get_obj
+            node_type(NodeType): only grade objects of this type
+        '''
+        self.debug = solution.debug
+        self.missingObject = scores['missing_object']
+        self.missingAttribute = None
+        # str(NodeType) -> score per missing property
+        self.missingProperty = dict()
+
+        # (object, nodeType, attributes, allAttributeLabels) of all objects to check, attributes are checked as part of their node
+        self.objects = list()
+        # nodeType -> labels to look up in the submission, matched in one batch per type
+        self.lookups = dict()
+        objects = solution.get_obj(label, node_type = node_type)
+        # a single object for an exact label: an ERObject record, or the dict of a plain node
+        if isinstance(objects, Mapping):
+            objects = [objects]
+        for obj in objects:
+            nodeType = obj.get('nodeType', NodeType.NOT_SPECIFIED)
+            if nodeType == str(NodeType.ATTRIBUTE) or nodeType == str(NodeType.COMPOSED_ATTRIBUTE):
+                continue
+            self.missingProperty[nodeType] = scores['missing_property'][nodeType]
+            attributes = []
+            allAttributeLabels = []
+            if nodeType == str(NodeType.NODE):
+                self.missingAttribute = scores['missing_property'][str(NodeType.ATTRIBUTE)]
+                attributes = [(attr.get('label', ''), list(attr.items())) for attr in solution.get_attr(f"{obj.get('label', '')}.*")]
+                allAttributeLabels = [attr.get('label', '') for attr in solution.get_attr_and_comp(f"{obj.get('label', '')}.*")]
+                self.lookups.setdefault(str(NodeType.ATTRIBUTE), dict()).update((attrLabel, None) for attrLabel, attrItems in attributes)
+            if nodeType != str(NodeType.RELATION):
+                self.lookups.setdefault(nodeType, dict())[obj['label']] = None
+            self.objects.append((dict(obj), nodeType, attributes, allAttributeLabels))
+        self.lookups = {nodeType: list(labels) for nodeType, labels in self.lookups.items()}
+        self.__fingerprint = None
+
+    @staticmethod
+    def _hash(value):
+        '''
+        Returns:
+            str: hex digest of the JSON encoding of the value
+        '''
+        data = json.dumps(value, sort_keys=True, default=str)
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+    def fingerprint(self):
+        '''
+        get the hash of the objects graded, computed on first use
+        Returns:
+            str: hex digest, equal for solutions grading the same objects in the same order
+        '''
+        if self.__fingerprint is None:
+            self.__fingerprint = self._hash(self.objects)
+        return self.__fingerprint
+
+    def scores_hash(self):
+        '''
+        Returns:
+            str: hex digest of the scores used by this solution
+        '''
+        return self._hash([self.missingObject, self.missingAttribute, self.missingProperty])
+
+    @staticmethod
+    def _comparable(value, otherValue):
+        '''
+        get the values to compare fuzzily: lists of labels are compared as their JSON export
+        Returns:
+            tuple: (value, otherValue)
+        '''
+        if (isinstance(value, tuple) or isinstance(otherValue, tuple)) and value != otherValue:
+            return ERObject.encode(value), ERObject.encode(otherValue)
+        return value, otherValue
+
+    @staticmethod
+    def compare_node_properties(thisNode, otherNode, key, debugging=False):
+        '''
+        compare a property of two objects
+        Args:
+            thisNode(dict): object of the solution
+            otherNode(dict): object of the submission
+            key(str): the property to compare
+            debugging(bool): print mismatches
+        Returns:
+            bool: True if the property matches
+        '''
+        #if debugging:
+        #    print(f"comparing property[{thisNode.get('label', '')}.{key}]: {thisNode[key]} vs {otherNode[key]}")
+        thisValue = thisNode.get(key, "")
+        otherValue = otherNode.get(key, "")
+
+        # RELATION: don't check "relation" and "relationLabel" strings
+        if thisNode.get('nodeType', NodeType.NOT_SPECIFIED) == str(NodeType.RELATION):
+            if key == "relation":
+                return True
+            if key == "relationLabel":
+                return True
+
+            # RELATION: don't differentiate between letters
+            if  (key == "fromEdgeLabel" or key == "toEdgeLabel") and (otherValue.isalpha() and thisValue.isalpha()):
+                #if debugging:
+                #    print(f"   // ignoring literal mismatch in edge label {thisValue} vs {otherValue}")
+                return True
+
+            if thisValue != otherValue:
+                #if debugging: print(f"direct property match {key} fail {thisValue} vs {otherValue}")
+                check = False
+                if key == "relationFrom":
+                    check = (thisNode.get("relationFrom", "") == otherNode.get("relationTo", ""))
+                if key == "relationTo":
+                    check = (thisNode.get("relationTo", "") == otherNode.get("relationFrom", ""))
+                if key == "fromEdgeLabel":
+                    check = (thisNode.get("fromEdgeLabel", "") == otherNode.get("toEdgeLabel", ""))
+                if key == "toEdgeLabel":
+                    check = (thisNode.get("toEdgeLabel", "") == otherNode.get("fromEdgeLabel", ""))
+                return check
+
+        thisValue, otherValue = CompiledSolution._comparable(thisValue, otherValue)
+        if not Similarity.is_similar(thisValue, otherValue, 0.8, strict=True):
+            if debugging:
+                print(f"property compare {key} fail {thisValue} vs {otherValue} @ {Similarity.ratio(thisValue, otherValue)*100:.2f}")
+            return False
+        return True
+
+    def match(self, otherGraph, lookups=None):
+        '''
+        look up the labels of the solution in a submission, one batch per NodeType
+        Args:
+            otherGraph(ER): the submission
+            lookups(dict): nodeType -> labels to look up, all labels of the solution if None
+        Returns:
+            dict: (nodeType, label) -> matching object of the submission, [] if missing
+        '''
+        if lookups is None:
+            lookups = self.lookups
+        matches = dict()
+        for nodeType, labels in lookups.items():
+            for label, obj in zip(labels, otherGraph.get_objs(labels, nodeType)):
+                matches[(nodeType, label)] = obj
+        return matches
+
+    def compareGraphs(self, otherGraph, debug=False, deductions=None):
+        '''
+        calculate the distance of a submission to this solution, i.e. points to be deducted
+        Args:
+            otherGraph(ER): the submission
+            debug(bool): print the deductions
+            deductions(list): if given, a dict per deduction is appended, see deduct
+        Returns:
+            float: the distance
+        '''
+        debugging = debug or self.debug
+        matches = self.match(otherGraph)
+
+        dist = 0
+        for index in range(len(self.objects)):
+            dist += self.grade_object(index, otherGraph, matches, debugging, deductions)
+            if debugging:
+                print(f"   =  {dist:.2f}")
+
+        if debugging:
+            print(f" ---------------")
+            print(f"   ∑  {dist:.2f}")
+        return dist
+
+    @staticmethod
+    def deduct(deductions, label, key, points):
+        '''
+        record a deduction if deductions are collected
+        Args:
+            deductions(list): the deductions collected or None
+            label(str): label of the object of the solution
+            key(str): the mismatching property, None if the object is missing
+            points(float): the points deducted
+        '''
+        if deductions is not None:
+            deductions.append({'label': label, 'key': key, 'points': points})
+
+    def grade_object(self, index, otherGraph, matches, debugging=False, deductions=None):
+        '''
+        calculate the distance of a submission for one object of this solution and its attributes
+        Args:
+            index(int): index of the object in self.objects
+            otherGraph(ER): the submission
+            matches(dict): the matches of the labels of this solution, see match
+            debugging(bool): print the deductions
+            deductions(list): if given, a dict per deduction is appended, see deduct
+        Returns:
+            float: the points to be deducted for this object
+        '''
+        n1, thisNodeType, attributes, allAttributeLabels = self.objects[index]
+        if debugging:
+            print(f" » testing {n1.get('label', '')}:")
+
+        if thisNodeType == str(NodeType.RELATION):
+            # a relation is only found if all its properties match
+            n2 = otherGraph.get_rel_adv(n1)
+            otherGraphHasObjectBool = n2 != False
+        else:
+            n2 = matches[(thisNodeType, n1["label"])]
+            otherGraphHasObjectBool = len(n2) > 0
+
+        # check (by label) if object exists in other graph
+        if not otherGraphHasObjectBool:
+            # not found.
+            if debugging:
+                print(f"   ✗ {self.missingObject:+.2f}, {thisNodeType} '{n1.get('label', '')}' doesn't exist in other graph")
+            dist = self.missingObject
+            self.deduct(deductions, n1.get('label', ''), None, self.missingObject)
+
+            # additionally substract points for missing node attributes
+            for attrLabel in allAttributeLabels:
+                if debugging:
+                    print(f"   ✗ {self.missingAttribute:+.2f}, missing {NodeType.ATTRIBUTE} '{attrLabel}' ")
+                dist += self.missingAttribute
+                self.deduct(deductions, attrLabel, None, self.missingAttribute)
+            return dist
+
+        # node exists, check equality and compare
+        if debugging:
+            print(f"   ✓        exists")
+        return self.__compare_two_nodes(n1, thisNodeType, attributes, n2, matches, debugging, deductions)
+
+    def __compare_two_nodes(self, thisNode, thisNodeType, attributes, otherNode, matches, debugging, deductions):
+        localDist = 0
+
+        # SPECIAL CASE: NodeType.NODE - compare node attributes
+        for attrLabel, attrItems in attributes:
+            distancePerProperty = self.missingAttribute
+
+            # is attribute missing?
+            otherAttr = matches[(str(NodeType.ATTRIBUTE), attrLabel)]
+            if len(otherAttr) == 0:
+                if debugging:
+                    print(f"   ✗ {distancePerProperty:+.2f}, missing {NodeType.ATTRIBUTE} '{attrLabel}' ")
+                localDist += distancePerProperty
+                self.deduct(deductions, attrLabel, None, distancePerProperty)
+            else:
+                # exists but check params (isWeak etc.)
+                for key, value in attrItems:
+                    value, otherValue = self._comparable(value, otherAttr[key])
+                    if not Similarity.is_similar(value, otherValue, 0.8):
+                        if (self.debug): print(f"compare attrs: '{value}' with '{otherValue}' @ {Similarity.ratio(value, otherValue)*100:.2f}%")
+                        if debugging:
+                            print(f"   ✗ {distancePerProperty:+.2f}, mismatch@{key}: {value} != {otherValue} ")
+                        localDist += distancePerProperty
+                        self.deduct(deductions, attrLabel, key, distancePerProperty)
+
+        # compare node properties (isWeak etc.)
+        distancePerProperty = self.missingProperty[thisNodeType]
+        for k in self.PROPERTY_KEYS[thisNodeType]:
+            if not self.compare_node_properties(thisNode, otherNode, k, debugging):
+                if debugging:
+                    print(f"   ✗ {distancePerProperty:+.2f}, property mismatch")
+                localDist += distancePerProperty
+                self.deduct(deductions, thisNode.get('label', ''), k, distancePerProperty)
+
+        return localDist
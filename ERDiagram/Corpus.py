@@ -0,0 +1,162 @@
+from erdiagram.ER import ER
+from erdiagram.ERObject import ERObject
+from contextlib import contextmanager
+from xml.sax.saxutils import escape, quoteattr
+import json
+import networkx as nx
+
+# GraphML keys of the objects and edges of a diagram: key -> (domain, type)
+GRAPHML_KEYS = {
+    'label': ('node', 'string'),
+    'relation': ('node', 'string'),
+    'relationLabel': ('node', 'string'),
+    'relationFrom': ('node', 'string'),
+    'relationTo': ('node', 'string'),
+    'fromEdgeLabel': ('node', 'string'),
+    'toEdgeLabel': ('node', 'string'),
+    'attrLabel': ('node', 'string'),
+    'parentLabel': ('node', 'string'),
+    'superClassLabel': ('node', 'string'),
+    'superLabel': ('node', 'string'),
+    'subLabel': ('node', 'string'),
+    'isPK': ('node', 'boolean'),
+    'isMultiple': ('node', 'boolean'),
+    'isWeak': ('node', 'boolean'),
+    'isDisjunct': ('node', 'boolean'),
+    'composedOf': ('node', 'string'),
+    'subClasses': ('node', 'string'),
+    'nodeType': ('node', 'string'),
+    'edgeLabel': ('edge', 'string'),
+    'directed': ('edge', 'boolean'),
+    'inverseDirection': ('edge', 'boolean'),
+    'name': ('graph', 'string')
+}
+
+@contextmanager
+def _open(target, mode):
+    '''
+    open the target if it is a path, use it as is if it is a file object
+    '''
+    if isinstance(target, str):
+        with open(target, mode, encoding='utf-8') as f:
+            yield f
+    else:
+        yield target
+
+def _named(diagrams):
+    '''
+    Returns:
+        generator: (name, diagram) for diagrams given as ER or (name, ER)
+    '''
+    for item in diagrams:
+        if isinstance(item, ER):
+            yield None, item
+        else:
+            yield item
+
+def write_jsonl(diagrams, target):
+    '''
+    Write many diagrams as JSON lines, one node-link document (see ER.asSolution) per line.
+    The diagrams are consumed one at a time, pass a generator to keep only one diagram in memory.
+
+    Args:
+        diagrams(iterable): ER diagrams or (name, ER) tuples, the name is stored as graph attribute
+        target(str or file): path or text file to write to
+    Returns:
+        int: the number of diagrams written
+    '''
+    count = 0
+    with _open(target, 'w') as f:
+        for name, diagram in _named(diagrams):
+            data = diagram.asSolution()
+            if name is not None:
+                data['graph'] = dict(data.get('graph', {}), name=name)
+            f.write(json.dumps(data))
+            f.write("\n")
+            count += 1
+    return count
+
+def read_jsonl(source, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
+    '''
+    Read diagrams written by write_jsonl, one line at a time.
+    Args:
+        source(str or file): path or text file to read from
+        engine(str): the graphviz engine to use
+        edge_len(float): the length of edeges
+        debug(bool): if true switch on debugging
+        graph_attr(dict): the graph attributes to use
+    Returns:
+        generator: (name, ER) for each line, the name is None if none was written
+    '''
+    with _open(source, 'r') as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            data = json.loads(line)
+            name = data.get('graph', {}).get('name', None)
+            yield name, ER.from_node_link(data, engine, edge_len, debug, graph_attr)
+
+def _graphml_data(f, indent, properties, domain):
+    for key, value in properties.items():
+        keyDomain, keyType = GRAPHML_KEYS.get(key, (None, None))
+        # GraphML needs all keys declared upfront, unknown properties are not written
+        if keyDomain != domain:
+            continue
+        if keyType == 'boolean':
+            value = 'true' if value else 'false'
+        f.write(f'{indent}<data key={quoteattr(key)}>{escape(str(value))}</data>\n')
+
+def write_graphml_many(diagrams, target):
+    '''
+    Write many diagrams into one GraphML document, one graph element per diagram.
+    The document is written incrementally, the diagrams are consumed one at a time.
+    Properties which are not in GRAPHML_KEYS are not written.
+
+    Args:
+        diagrams(iterable): ER diagrams or (name, ER) tuples, the name is stored as graph attribute
+        target(str or file): path or text file to write to
+    Returns:
+        int: the number of diagrams written
+    '''
+    count = 0
+    with _open(target, 'w') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+        for key, (domain, keyType) in GRAPHML_KEYS.items():
+            f.write(f'  <key id={quoteattr(key)} for="{domain}" attr.name={quoteattr(key)} attr.type="{keyType}" />\n')
+        for name, diagram in _named(diagrams):
+            f.write(f'  <graph id="G{count}" edgedefault="directed">\n')
+            if name is not None:
+                _graphml_data(f, '    ', {'name': name}, 'graph')
+            graph = diagram.get_graph()
+            for label, obj in graph.nodes(data=True):
+                f.write(f'    <node id={quoteattr(label)}>\n')
+                _graphml_data(f, '      ', ERObject.export(obj), 'node')
+                f.write('    </node>\n')
+            for fromLabel, toLabel, edge in graph.edges(data=True):
+                f.write(f'    <edge source={quoteattr(fromLabel)} target={quoteattr(toLabel)}>\n')
+                _graphml_data(f, '      ', edge, 'edge')
+                f.write('    </edge>\n')
+            f.write('  </graph>\n')
+            count += 1
+        f.write('</graphml>\n')
+    return count
+
+def read_graphml_many(source, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
+    '''
+    Read the diagrams of a GraphML document written by write_graphml_many.
+    The document is parsed at once, the diagrams are built one at a time.
+    Args:
+        source(str or file): path or file to read from
+        engine(str): the graphviz engine to use
+        edge_len(float): the length of edeges
+        debug(bool): if true switch on debugging
+        graph_attr(dict): the graph attributes to use
+    Returns:
+        generator: (name, ER) for each graph element, the name is None if none was written
+    '''
+    reader = nx.readwrite.graphml.GraphMLReader()
+    for graph in reader(path=source):
+        yield graph.graph.get('name', None), ER.from_graph(graph, engine, edge_len, debug, graph_attr)
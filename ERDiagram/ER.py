@@ -1,11 +1,14 @@
 from erdiagram.NodeType import NodeType
-from graphviz import Digraph
-from IPython.display import display
+from erdiagram.LabelIndex import LabelIndex
+from erdiagram.CompiledSolution import CompiledSolution
+from erdiagram.ERObject import ERObject
+from collections import OrderedDict
 from networkx.readwrite import json_graph
-from urllib.parse import quote
+import hashlib
 import json
 import networkx as nx
-from excmanager.Util import Util
+import struct
+import zlib
 
 class ER:
     '''
@@ -13,6 +16,11 @@ class ER:
         Michal Slupczynski RWTH DBIS 2021-2022
     '''
 
+    # header of the binary format of save/load: magic bytes and format version,
+    # the version is increased whenever the stored state changes
+    BINARY_MAGIC = b"ERDIAGRAM"
+    BINARY_VERSION = 2
+
     def __init__(self, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
         '''
         constructor
@@ -24,17 +32,26 @@ class ER:
             graph_attr(dict): the graph attributes to use 
             
         '''
-        # start counting at 0!
-        self.__id = -1
-        
         # default values
         self.debug = debug
         self.edge_len = edge_len
 
         # The semantic true graph - graphViz is only the representation
         self.graph = nx.DiGraph()
-        # @TODO -do this lazily we don't need the visualization while creating the graph
-        self.graphViz = Digraph('ER', engine=engine, graph_attr=graph_attr)
+        # label index of the objects in self.graph, maintained on insert
+        self.__index = LabelIndex()
+        # counts the objects added or replaced, see get_changes
+        self.revision = 0
+        # label -> revision of the last change, ordered by revision
+        self.__changes = OrderedDict()
+        # label -> content hash of the object / of the entity with its attributes, see get_hash
+        self.__hashes = dict()
+        self.__subtreeHashes = dict()
+        # the graphViz representation is built lazily from self.graph when it is rendered
+        self.engine = engine
+        self.graph_attr = graph_attr
+        self.__graphViz = None
+        self.__graphVizDirty = True
 
         # helper lists and dicts
         self.isAs = list()
@@ -55,26 +72,263 @@ class ER:
         
     @classmethod
     def copyfrom(cls, diagram, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
-        # TODO
-        new_diagram = cls(engine, edge_len, debug, graph_attr)
-        # Copy nodes & attributes
-        for node in diagram.nodes:
-            n = diagram.nodes[node]
-            new_diagram.add_node(n['name'], n['isMultiple'], n['isWeak'])
-            for attr in n["attributes"]:
-                new_diagram.add_attribute(n['name'], attr['attr_name'], attr['isPK'], attr['isMultiple'], attr['isWeak'], attr['composedOf'])
-        # Copy relations
-        for rel in diagram.relations:
-            new_diagram.add_relation(rel['from_edge'], rel['relation_label'], rel['to_edge'], rel['from_label'], rel['to_label'], rel['isWeak'])
-        # Copy isAs
-        for isA in diagram.isAs:
-            new_diagram.add_is_a(isA['superclass'], isA['subclass'], isA['super_label'], isA['sub_label'], isA['is_disjunct'])
+        '''
+        copy a diagram with other rendering settings, see clone
+        Args:
+            diagram(ER): the diagram to copy
+            engine(str): the graphviz engine to use
+            edge_len(float): the length of edeges
+            debug(bool): if true switch on debugging
+            graph_attr(dict): the graph attributes to use
+        Returns:
+            ER: the copy
+        '''
+        new_diagram = diagram.clone()
+        new_diagram.engine = engine
+        new_diagram.edge_len = edge_len
+        new_diagram.debug = debug
+        new_diagram.graph_attr = graph_attr
         return new_diagram
 
-    def __nextID(self):
-        # TODO: figure out if this is necessary
-        self.__id += 1
-        return self.__id
+    def clone(self):
+        '''
+        Copy this diagram without replaying the add_* calls.
+        The graph structure and the label index are copied, the object records and edge attributes
+        are shared: add_* calls replace records instead of modifying them, so changes to the clone
+        don't affect this diagram and vice versa. Only modifying a returned record in place, e.g.
+        get_node(label)['isWeak'] = True, shows up in both.
+        Returns:
+            ER: the copy
+        '''
+        diagram = type(self).__new__(type(self))
+        diagram.__dict__.update(self.__dict__)
+        graph = self.get_graph()
+        diagram.graph = type(graph)()
+        diagram.graph.graph.update(graph.graph)
+        # fill the networkx structures directly, Graph.copy would turn the records into dicts
+        diagram.graph._node.update(graph._node)
+        diagram.graph._succ.update((label, neighbors.copy()) for label, neighbors in graph._succ.items())
+        diagram.graph._pred.update((label, neighbors.copy()) for label, neighbors in graph._pred.items())
+        diagram.__index = self.__index.copy()
+        diagram.__changes = self.__changes.copy()
+        diagram.__hashes = self.__hashes.copy()
+        diagram.__subtreeHashes = self.__subtreeHashes.copy()
+        diagram.__graphViz = None
+        diagram.__graphVizDirty = True
+        diagram.graph_attr = dict(self.graph_attr)
+        diagram.isAs = list()
+        diagram.nodes = dict()
+        diagram.nodesInfoDict = dict()
+        diagram.relations = list()
+        return diagram
+
+    @classmethod
+    def from_spec(cls, entities=[], attributes=[], relations=[], isAs=[], engine='dot', edge_len=1.5, debug=False, graph_attr={}):
+        '''
+        Build a diagram from many objects at once.
+        Each object is given by the arguments of the corresponding add_* call, either as a tuple of
+        positional arguments, a dict of keyword arguments or (entities only) a plain label.
+        Unlike the add_* calls, parent and connected nodes are looked up by their exact label.
+        Nodes which are referenced but not listed in entities are created in one pass,
+        with the same defaults as add_attribute, add_relation and add_is_a would use.
+
+        Args:
+            entities(list): arguments of add_node
+            attributes(list): arguments of add_attribute
+            relations(list): arguments of add_relation
+            isAs(list): arguments of add_is_a
+            engine(str): the graphviz engine to use
+            edge_len(float): the length of edeges
+            debug(bool): if true switch on debugging
+            graph_attr(dict): the graph attributes to use
+        Returns:
+            ER: the new diagram
+        '''
+        def bind(func, spec):
+            if isinstance(spec, str):
+                return func(spec)
+            if isinstance(spec, dict):
+                return func(**spec)
+            return func(*spec)
+
+        def nodeArgs(label, isMultiple=False, isWeak=False):
+            return label, isMultiple, isWeak
+
+        def attrArgs(nodeLabel, attrLabel, isPK=False, isMultiple=False, isWeak=False, composedOf=[]):
+            return nodeLabel, attrLabel, isPK, isMultiple, isWeak, composedOf
+
+        def relationArgs(fromNodeLabel, relationLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak=False):
+            return fromNodeLabel, relationLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak
+
+        def isAArgs(superClassLabel, subclassParam, superLabel='', subLabel='', isDisjunct=True):
+            return superClassLabel, cls.__subclass_list(subclassParam), superLabel, subLabel, isDisjunct
+
+        # label -> (isMultiple, isWeak), listed nodes first, then missing nodes in order of reference
+        nodes = dict()
+        for spec in entities:
+            label, isMultiple, isWeak = bind(nodeArgs, spec)
+            nodes[label] = (isMultiple, isWeak)
+        attributes = [bind(attrArgs, spec) for spec in attributes]
+        relations = [bind(relationArgs, spec) for spec in relations]
+        isAs = [bind(isAArgs, spec) for spec in isAs]
+        for attr in attributes:
+            nodes.setdefault(attr[0], (False, False))
+        for relation in relations:
+            if relation[0] != '':
+                nodes.setdefault(relation[0], (False, False))
+            nodes.setdefault(relation[2], (False, relation[5]))
+        for isA in isAs:
+            for label in [isA[0]] + isA[1]:
+                nodes.setdefault(label, (False, False))
+
+        diagram = cls(engine, edge_len, debug, graph_attr)
+        for label, (isMultiple, isWeak) in nodes.items():
+            diagram.__add_graphml_node(label, isMultiple, isWeak)
+        for attr in attributes:
+            diagram.__insert_attribute(*attr)
+        for relation in relations:
+            diagram.__insert_relation(*relation)
+        for superClassLabel, subClasses, superLabel, subLabel, isDisjunct in isAs:
+            diagram.__add_graphml_is_a(superClassLabel, superLabel, subLabel, isDisjunct, subClasses)
+        return diagram
+
+    @classmethod
+    def from_node_link(cls, data, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
+        '''
+        Build a diagram from node-link data as produced by asSolution, in one pass over the objects.
+        Args:
+            data(dict or str): the node-link data or its JSON encoding, edges under "links" or "edges"
+            engine(str): the graphviz engine to use
+            edge_len(float): the length of edeges
+            debug(bool): if true switch on debugging
+            graph_attr(dict): the graph attributes to use
+        Returns:
+            ER: the diagram
+        '''
+        if isinstance(data, str):
+            data = json.loads(data)
+        # networkx < 3.4 writes the edges as "links"
+        links = data['links'] if 'links' in data else data.get('edges', [])
+        objects = [(node['id'], {key: value for key, value in node.items() if key != 'id'}) for node in data['nodes']]
+        edges = [(link['source'], link['target'], {key: value for key, value in link.items() if key != 'source' and key != 'target'})
+            for link in links]
+        return cls.__from_objects(objects, edges, engine, edge_len, debug, graph_attr)
+
+    @classmethod
+    def read_graphml(cls, path, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
+        '''
+        Read a diagram written by write_graphml, in one pass over the objects.
+        Args:
+            path(str): the GraphML file
+            engine(str): the graphviz engine to use
+            edge_len(float): the length of edeges
+            debug(bool): if true switch on debugging
+            graph_attr(dict): the graph attributes to use
+        Returns:
+            ER: the diagram
+        '''
+        return cls.from_graph(nx.read_graphml(path), engine, edge_len, debug, graph_attr)
+
+    @classmethod
+    def from_graph(cls, graph, engine='dot', edge_len=1.5, debug=False, graph_attr={}):
+        '''
+        Build a diagram from a networkx graph with the node and edge attributes of get_graph,
+        e.g. as read by networkx from an export, in one pass over the objects.
+        Args:
+            graph(nx.DiGraph): the graph
+            engine(str): the graphviz engine to use
+            edge_len(float): the length of edeges
+            debug(bool): if true switch on debugging
+            graph_attr(dict): the graph attributes to use
+        Returns:
+            ER: the diagram
+        '''
+        return cls.__from_objects(graph.nodes(data=True), graph.edges(data=True), engine, edge_len, debug, graph_attr)
+
+    @classmethod
+    def __from_objects(cls, objects, edges, engine, edge_len, debug, graph_attr):
+        '''
+        Build a diagram from exported objects and edges without replaying the add_* calls
+        Args:
+            objects(list): (label, properties) of the objects in insertion order
+            edges(list): (fromNodeLabel, toNodeLabel, properties) of the edges
+        Returns:
+            ER: the diagram
+        '''
+        diagram = cls(engine, edge_len, debug, graph_attr)
+        diagram.__insert_objects(objects, edges)
+        return diagram
+
+    def __insert_objects(self, objects, edges):
+        '''
+        add objects and edges as they are, without looking up parents or connected nodes
+        Args:
+            objects(list): (label, properties) of the objects in insertion order
+            edges(list): (fromNodeLabel, toNodeLabel, properties) of the edges
+        '''
+        for label, properties in objects:
+            properties = dict(properties)
+            if 'nodeType' not in properties:
+                # e.g. the empty "from" node of a relation, not an object of the diagram
+                self.get_graph().add_node(label, **properties)
+                self.__forget_hashes(label)
+                continue
+            nodeType = properties.pop('nodeType')
+            self.__add_graph_obj(label, nodeType, **properties)
+        self.get_graph().add_edges_from(edges)
+        self.__graphVizDirty = True
+
+    def __add_graph_obj(self, graphKey, nodeType, **properties):
+        '''
+        add object to graphML graph and label index
+        Args:
+            graphKey(str): key of the object in the graph (its full label)
+            nodeType(str): str(NodeType) of the object
+            properties(dict): properties of the object
+        '''
+        graph = self.get_graph()
+        graph.add_node(graphKey)
+        # the node data is a compact record instead of the attribute dict networkx creates
+        graph._node[graphKey] = ERObject.create(nodeType, **properties)
+        self.__graphVizDirty = True
+        endpoints = None
+        if nodeType == str(NodeType.RELATION):
+            endpoints = (properties['relationFrom'], properties['relationTo'])
+        self.__index.add(graphKey, nodeType, endpoints)
+        self.revision += 1
+        self.__changes[graphKey] = self.revision
+        self.__changes.move_to_end(graphKey)
+        self.__forget_hashes(graphKey)
+
+    def __forget_hashes(self, label):
+        '''
+        drop the cached hashes a changed object is part of
+        '''
+        self.__hashes.pop(label, None)
+        # the subtree of an entity contains "{entity}.{attribute}" and "{entity}.{attribute}.{composed}"
+        prefix, dot, rest = label.partition(".")
+        self.__subtreeHashes.pop(label, None)
+        while dot:
+            self.__subtreeHashes.pop(prefix, None)
+            part, dot, rest = rest.partition(".")
+            prefix = f"{prefix}.{part}"
+
+    def get_changes(self, revision):
+        '''
+        get the objects added or replaced by add_* calls, merges and loaders since the given revision.
+        Modifying a returned record in place is not tracked.
+        Args:
+            revision(int): a previous value of self.revision
+        Returns:
+            list: labels of the changed objects, in order of their last change
+        '''
+        changed = []
+        for label in reversed(self.__changes):
+            if self.__changes[label] <= revision:
+                break
+            changed.append(label)
+        changed.reverse()
+        return changed
 
     def __add_graphml_node(self, label, isMultiple=False, isWeak=False):
         '''
@@ -86,11 +340,10 @@ class ER:
         '''
         if self.debug: 
             print(f">> adding node: {label}")
-        self.get_graph().add_node(label, 
+        self.__add_graph_obj(label, str(NodeType.NODE),
             label = label,
             isMultiple = isMultiple,
-            isWeak = isWeak,
-            nodeType = str(NodeType.NODE)
+            isWeak = isWeak
         )
         
         '''
@@ -165,15 +418,14 @@ class ER:
         else:
             nodeType = str(NodeType.COMPOSED_ATTRIBUTE)
 
-        self.get_graph().add_node(directLabel, 
+        self.__add_graph_obj(directLabel, nodeType,
             label = directLabel,
             attrLabel = attrLabel,
             parentLabel = parentLabel,
             isPK = isPK,
             isMultiple = isMultiple,
             isWeak = isWeak,
-            composedOf = json.dumps(composedOf),
-            nodeType = nodeType
+            composedOf = composedOf
         )
 
     def __add_graphml_relation(self, label, fromNodeLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak=False):
@@ -190,69 +442,64 @@ class ER:
         relationLabel = f"{fromNodeLabel}-->{label}<--{toNodeLabel}"
         if self.debug: 
             print(f">> adding relation: {label}")
-        self.get_graph().add_node(relationLabel, 
+        self.__add_graph_obj(relationLabel, str(NodeType.RELATION),
             label = relationLabel,
-            relation = f"{fromNodeLabel}<-[{fromEdgeLabel}]--[{toEdgeLabel}]->{toNodeLabel}",
             relationLabel = label,
             relationFrom = fromNodeLabel,
             relationTo = toNodeLabel,
             fromEdgeLabel = fromEdgeLabel,
             toEdgeLabel = toEdgeLabel,
-            isWeak = isWeak,
-            nodeType = str(NodeType.RELATION)
+            isWeak = isWeak
         )
 
         self.__add_graphml_edge(fromNodeLabel, relationLabel, fromEdgeLabel)
         self.__add_graphml_edge(relationLabel, toNodeLabel, toEdgeLabel)
 
     def __add_graphml_is_a(self, superClassLabel, superLabel, subLabel, isDisjunct=False, subClasses=[]):
-        if isDisjunct:
-            isALabel = f"{superClassLabel}.isA.{subClasses}"
-            relation = f"{superClassLabel}->[{superLabel}]->[isA]->[{subLabel}]->{subClasses}"
-        else:
-            isALabel = f"{superClassLabel}.isA.{subClasses}"
-            relation = f"{superClassLabel}<-[{superLabel}]<-[isA]<-[{subLabel}]<-{subClasses}"
+        isALabel = f"{superClassLabel}.isA.{subClasses}"
         if self.debug: 
             print(f">> adding relation: {isALabel}")
         
-        self.get_graph().add_node( isALabel,
+        self.__add_graph_obj(isALabel, str(NodeType.IS_A),
             label = isALabel,
-            relation = relation,
             superClassLabel = superClassLabel,
             superLabel = superLabel,
             subLabel = subLabel,
             isDisjunct = isDisjunct,
-            subClasses = json.dumps(subClasses),
-            nodeType = str(NodeType.IS_A)
+            subClasses = subClasses
         )
 
         self.__add_graphml_edge(superClassLabel, isALabel, superLabel, directed=True, inverseDirection=isDisjunct)
         for i, subclass in enumerate(subClasses):
             self.__add_graphml_edge(isALabel, subclass, subLabel, directed=True, inverseDirection=isDisjunct)
 
-    def __add_graphviz_node(self, label, isMultiple=False, isWeak=False):
+    def __add_graphviz_node(self, graphViz, nodeStyle, label, isMultiple=False, isWeak=False):
         '''
         add node to rendering
         Args:
+            graphViz(Digraph): the rendering to add to
+            nodeStyle(dict): the node attributes in effect in the rendering, see __set_node_style
             label(str): node label
             isMultiple(bool): is cardinality of node multiple or singular?
             isWeak(bool): is this a weak node?
         '''
         # Add Node for rendering - a Blue box
         if isMultiple or isWeak:
-            self.graphViz.attr('node', shape='box', style='filled',
+            self.__set_node_style(graphViz, nodeStyle, shape='box', style='filled',
                             fillcolor='#CCCCFF', color='#0000FF', peripheries='2')
         else:
-            self.graphViz.attr('node', shape='box', style='filled',
+            self.__set_node_style(graphViz, nodeStyle, shape='box', style='filled',
                             fillcolor='#CCCCFF', color='#0000FF', peripheries='1')
-        self.graphViz.node(label)
+        graphViz.node(label)
 
 
 
-    def __add_graphviz_attr(self, parentLabel, attrLabel, fullAttrLabel, isMultiple):
+    def __add_graphviz_attr(self, graphViz, nodeStyle, parentLabel, attrLabel, fullAttrLabel, isMultiple):
         '''
         add attribute to rendering
         Args:
+            graphViz(Digraph): the rendering to add to
+            nodeStyle(dict): the node attributes in effect in the rendering, see __set_node_style
             parentLabel(str): label of parent node
             attrLabel(str): label of attribute
             fullAttrLabel(str): label of form {parentLabel}.{attrLabel} with underlined formatting
@@ -261,58 +508,101 @@ class ER:
         '''
         if isMultiple:
             # Can be Multiple, then it has a double outline
-            self.graphViz.attr('node', shape='ellipse', style='filled',
+            self.__set_node_style(graphViz, nodeStyle, shape='ellipse', style='filled',
                             fillcolor='#FFFBD6', color='#656354', peripheries='2')
         else:
-            self.graphViz.attr('node', shape='ellipse', style='filled',
+            self.__set_node_style(graphViz, nodeStyle, shape='ellipse', style='filled',
                             fillcolor='#FFFBD6', color='#656354', peripheries='1')
 
-        self.graphViz.node(fullAttrLabel, label=attrLabel)
+        graphViz.node(fullAttrLabel, label=attrLabel)
 
-        self.graphViz.edge(parentLabel, fullAttrLabel, arrowhead='none')   
+        graphViz.edge(parentLabel, fullAttrLabel)
 
-    def __add_graphviz_relation(self, relationLabel, fromNodeLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak):
+    def __add_graphviz_relation(self, graphViz, nodeStyle, relationLabel, fromNodeLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak):
         edge_color = 'black:invis:black' if isWeak else 'black'
 
         if isWeak:
-            self.graphViz.attr('node', shape='diamond', style='filled',
+            self.__set_node_style(graphViz, nodeStyle, shape='diamond', style='filled',
                             fillcolor='#FFCCCC', color='#BA2128', peripheries='2')
         else:
-            self.graphViz.attr('node', shape='diamond', style='filled',
+            self.__set_node_style(graphViz, nodeStyle, shape='diamond', style='filled',
                             fillcolor='#FFCCCC', color='#BA2128', peripheries='1')
 
-        self.graphViz.node(relationLabel)
+        graphViz.node(relationLabel)
 
         if fromNodeLabel != '':
-            self.graphViz.edge(fromNodeLabel, relationLabel, label=fromEdgeLabel, len=str(
-                self.edge_len), arrowhead='none')
+            graphViz.edge(fromNodeLabel, relationLabel, label=fromEdgeLabel, len=str(
+                self.edge_len))
 
-        self.graphViz.edge(relationLabel, toNodeLabel, label=toEdgeLabel,
-                        len=str(self.edge_len), arrowhead='none', color=edge_color)
+        graphViz.edge(relationLabel, toNodeLabel, label=toEdgeLabel,
+                        len=str(self.edge_len), color=edge_color)
 
-    def __add_graphviz_is_a(self, superClassLabel, super_label, sub_label, is_disjunct, subClasses):
-        self.graphViz.attr('node', shape='invtriangle', style='filled',
+    def __add_graphviz_is_a(self, graphViz, nodeStyle, isA_ID, superClassLabel, super_label, sub_label, is_disjunct, subClasses):
+        self.__set_node_style(graphViz, nodeStyle, shape='invtriangle', style='filled',
                         fillcolor='#CCFFCC', color='#506550', peripheries='1')
 
-        isA_ID = self.__nextID() # is this necessary??
-
-        self.graphViz.node('is_A' + str(isA_ID), 'isA')
+        graphViz.node('is_A' + str(isA_ID), 'isA')
 
-        self.graphViz.edge(superClassLabel, 'is_A' + str(isA_ID),
-                        label=super_label, len=str(self.edge_len), arrowhead='none')
+        graphViz.edge(superClassLabel, 'is_A' + str(isA_ID),
+                        label=super_label, len=str(self.edge_len))
 
         if not is_disjunct:
             for i, subclass in enumerate(subClasses):
-                self.graphViz.edge('is_A' + str(isA_ID), subclass, label=sub_label, len=str(
+                graphViz.edge('is_A' + str(isA_ID), subclass, label=sub_label, len=str(
                     self.edge_len), arrowhead='normal', dir='back')
         else:
             for i, subclass in enumerate(subClasses):
-                self.graphViz.edge('is_A' + str(isA_ID),
+                graphViz.edge('is_A' + str(isA_ID),
                                 subclass, label=sub_label, len=str(self.edge_len), arrowhead='normal')
 
+    @staticmethod
+    def __set_node_style(graphViz, nodeStyle, **style):
+        '''
+        set the node attributes of the following nodes of the rendering.
+        Only the attributes which differ from the current ones are written, the node attributes
+        apply to all nodes declared afterwards.
+        Args:
+            graphViz(Digraph): the rendering to add to
+            nodeStyle(dict): the node attributes in effect in the rendering, updated
+            style(dict): the node attributes
+        '''
+        changed = {key: value for key, value in style.items() if nodeStyle.get(key, None) != value}
+        if len(changed) > 0:
+            graphViz.attr('node', **changed)
+            nodeStyle.update(changed)
 
-
-
+    def __build_graphviz(self):
+        '''
+        build the rendering of the graphML graph.
+        The state of the build is kept in locals, several threads can build the same diagram.
+        Returns:
+            Digraph: the graphviz representation of this diagram
+        '''
+        from graphviz import Digraph
+        # edges are undirected lines unless an arrowhead is given
+        graphViz = Digraph('ER', engine=self.engine, graph_attr=self.graph_attr, edge_attr={'arrowhead': 'none'})
+        # node attributes in effect while building and the number of isA nodes so far
+        nodeStyle = dict()
+        isACount = 0
+        for label, obj in self.get_graph().nodes(data=True):
+            nodeType = obj.get('nodeType', NodeType.NOT_SPECIFIED)
+            if nodeType == str(NodeType.NODE):
+                # a blue rectangle
+                self.__add_graphviz_node(graphViz, nodeStyle, label, obj['isMultiple'], obj['isWeak'])
+            elif nodeType == str(NodeType.ATTRIBUTE) or nodeType == str(NodeType.COMPOSED_ATTRIBUTE):
+                # a yellow circle, label can be PrimaryKey (isPK), then it's underlined.
+                graphVizAttrLabel = self.__format_label(obj['attrLabel'], obj['isWeak'], obj['isPK'])
+                self.__add_graphviz_attr(graphViz, nodeStyle, obj['parentLabel'], graphVizAttrLabel, label, obj['isMultiple'])
+            elif nodeType == str(NodeType.RELATION):
+                # a red rhombus
+                self.__add_graphviz_relation(graphViz, nodeStyle, obj['relationLabel'], obj['relationFrom'], obj['relationTo'], 
+                    obj['fromEdgeLabel'], obj['toEdgeLabel'], obj['isWeak'])
+            elif nodeType == str(NodeType.IS_A):
+                # a green inverted triangle
+                self.__add_graphviz_is_a(graphViz, nodeStyle, isACount, obj['superClassLabel'], obj['superLabel'], obj['subLabel'], 
+                    obj['isDisjunct'], obj['subClasses'])
+                isACount += 1
+        return graphViz
 
     def add_node(self, label, isMultiple=False, isWeak=False):
         '''
@@ -325,10 +615,6 @@ class ER:
         # add new node to graphML graph
         self.__add_graphml_node(label, isMultiple, isWeak)
 
-        # add new node to graphViz graph - a blue rectangle
-        # TODO: refactor this to .render() function
-        self.__add_graphviz_node(label, isMultiple, isWeak)
-
     def add_attribute(self, nodeLabel, attrLabel, isPK=False, isMultiple=False, isWeak=False, composedOf=[]):
         '''
         Add an attribute to an entity in the graph
@@ -340,17 +626,20 @@ class ER:
             isWeak(bool): is this a weak attribute?
             composedOf(list): list of attributes this attribute is built of
         '''
-        fullAttrLabel = f'{nodeLabel}.{attrLabel}'
-
-        # label can be PrimaryKey (isPK), then it's underlined.
-        graphVizAttrLabel = self.__format_label(attrLabel, isWeak, isPK)
-
         # if parent node doesn't exist, create it
         if not self.has_node(nodeLabel):
             if self.debug:
                 print(f">> node not found, adding {nodeLabel}")
             self.add_node(nodeLabel)
 
+        self.__insert_attribute(nodeLabel, attrLabel, isPK, isMultiple, isWeak, composedOf)
+
+    def __insert_attribute(self, nodeLabel, attrLabel, isPK=False, isMultiple=False, isWeak=False, composedOf=[]):
+        '''
+        add an attribute and its composed attributes without checking for the parent node
+        '''
+        fullAttrLabel = f'{nodeLabel}.{attrLabel}'
+
         if isinstance(composedOf, str):
             composedOf = json.loads(composedOf)
 
@@ -360,16 +649,10 @@ class ER:
         # add new edge to graphML graph connecting the parent node to this new attribute
         self.__add_graphml_edge(nodeLabel, fullAttrLabel)
 
-        # add new attribute to graphViz graph - a yellow circle
-        # TODO: refactor this to .render() function
-        self.__add_graphviz_attr(nodeLabel, graphVizAttrLabel, fullAttrLabel, isMultiple)
-
         if self.debug and len(composedOf) > 0:
             print(f">- -> {len(composedOf)} sublabels found")
 
         for subAttrLabel in composedOf:
-            graphVizSubLabel = self.__format_label(subAttrLabel, isWeak, isPK)
-            
             fullSubLabel = f'{nodeLabel}.{attrLabel}.{subAttrLabel}'
             
             if self.debug:
@@ -379,9 +662,6 @@ class ER:
             self.__add_graphml_attr(f'{nodeLabel}.{attrLabel}', subAttrLabel, isPK, isMultiple, isWeak, isComposed=True)
             self.__add_graphml_edge(f'{nodeLabel}.{attrLabel}', fullSubLabel)
 
-            # add to graphViz graph
-            self.__add_graphviz_attr(f'{nodeLabel}.{attrLabel}', graphVizSubLabel, fullSubLabel, isMultiple)
-
     def add_relation(self, fromNodeLabel, relationLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak=False):
         '''
         Add a relation with two labelled edges
@@ -402,11 +682,13 @@ class ER:
                 print(f">> toNode missing, adding {toNodeLabel}")
             self.add_node(toNodeLabel, isWeak=isWeak)
 
-        self.__add_graphml_relation(relationLabel, fromNodeLabel, toNodeLabel, fromEdgeLabel.replace(" ", ""), toEdgeLabel.replace(" ", ""), isWeak)
+        self.__insert_relation(fromNodeLabel, relationLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak)
 
-        # TODO: refactor this to .render() function
-        # Add a relation between two nodes - a red rhombus
-        self.__add_graphviz_relation(relationLabel, fromNodeLabel, toNodeLabel, fromEdgeLabel.replace(" ", ""), toEdgeLabel.replace(" ", ""), isWeak)
+    def __insert_relation(self, fromNodeLabel, relationLabel, toNodeLabel, fromEdgeLabel, toEdgeLabel, isWeak=False):
+        '''
+        add a relation without checking for the connected nodes
+        '''
+        self.__add_graphml_relation(relationLabel, fromNodeLabel, toNodeLabel, fromEdgeLabel.replace(" ", ""), toEdgeLabel.replace(" ", ""), isWeak)
 
     def add_is_a(self, superClassLabel, subclassParam, superLabel='', subLabel='', isDisjunct=True):
         '''
@@ -419,13 +701,7 @@ class ER:
             isDisjunct(bool): Are the elements of this relation disjunct?
         '''
         # Add "X is a Y" relation - a green inverted triangle from a superclass to multiple subclasses
-        if not isinstance(subclassParam, list):
-            subClasses = [subclassParam]
-        else:
-            subClasses = subclassParam
-
-        if subClasses is not None:
-            subClasses.sort()
+        subClasses = self.__subclass_list(subclassParam)
 
         if not self.has_node(superClassLabel):
             self.add_node(superClassLabel)
@@ -435,9 +711,22 @@ class ER:
 
         self.__add_graphml_is_a(superClassLabel, superLabel, subLabel, isDisjunct, subClasses)
 
-        # TODO: refactor this to .render() function
-        self.__add_graphviz_is_a(superClassLabel, superLabel, subLabel, isDisjunct, subClasses)
+    @staticmethod
+    def __subclass_list(subclassParam):
+        '''
+        Returns:
+            list: sorted list of subclass labels
+        '''
+        if isinstance(subclassParam, tuple):
+            subClasses = list(subclassParam)
+        elif not isinstance(subclassParam, list):
+            subClasses = [subclassParam]
+        else:
+            subClasses = subclassParam
 
+        if subClasses is not None:
+            subClasses.sort()
+        return subClasses
 
     def getNodeByLabel(self, label):
         if ( label in self.nodes.keys() ):
@@ -445,15 +734,25 @@ class ER:
         else:
             return None
 
-    def display(self):
-        self.draw()
+    def display(self, cache=None):
+        self.draw(cache)
         
-    def draw(self):
-        display(self.graphViz)
+    def draw(self, cache=None):
+        '''
+        display this diagram in a notebook
+        Args:
+            cache(RenderCache): if given, the SVG is taken from the cache and only rendered on a miss
+        '''
+        from IPython.display import display
+        if cache is None:
+            display(self.get_graphViz())
+        else:
+            from IPython.display import SVG
+            display(SVG(filename=cache.render(self, 'svg')))
 
     def asSolution(self, format="json"):
         if format == "json":
-            return json_graph.node_link_data(self.get_graph())
+            return json_graph.node_link_data(self.__export_graph())
 
         return "please pick data format"
 
@@ -463,87 +762,66 @@ class ER:
     def get_default_scores(self):
         return self.__default_scores        
 
-    def _add_obj_node(self, obj):
-        self.add_node(obj.get('label', ''), isMultiple = obj['isMultiple'], isWeak = obj['isWeak'])
-        if self.debug:
-            print(f"    ✓  added node {obj.get('label', '')}:")
-            print(f"       isMultiple = {obj['isMultiple']}, isWeak = {obj['isWeak']}")
-    
-    def _add_obj_attr(self, obj):
-        self.add_attribute(
-            obj['parentLabel'], obj['attrLabel'], 
-            isPK = obj['isPK'], isMultiple = obj['isMultiple'], isWeak = obj['isWeak'], 
-            composedOf = obj['composedOf']
-        )
-        if self.debug:
-            print(f"    ✓  added attribute {obj['attrLabel']} to node {obj['parentLabel']}:")
-            print(f"       isPK = obj['isPK'], isMultiple = {obj['isMultiple']}, isWeak = {obj['isWeak']}, composedOf = {obj['composedOf']}")
-
-    def _add_obj_is_a(self, obj):
-        self.add_is_a(
-            superClassLabel = obj['superClassLabel'], subclassParam = json.loads(obj['subClasses']),
-            superLabel = obj['superLabel'], subLabel = obj['subLabel'], isDisjunct = obj['isDisjunct']
-        )
-        if self.debug:
-            print(f"    ✓  added isA {json.loads(obj['subClasses'])} to super class {obj['superClassLabel']}:")
-            print(f"       superLabel = {obj['superLabel']}, subLabel = {obj['subLabel']}, isDisjunct = {obj['isDisjunct']}")
-
-    def _add_obj_rel(self, obj):
-        self.add_relation(
-            fromNodeLabel=obj['relationFrom'], 
-            relationLabel=obj['relationLabel'], 
-            toNodeLabel=obj['relationTo'], 
-            fromEdgeLabel=obj['fromEdgeLabel'], 
-            toEdgeLabel=obj['toEdgeLabel'], 
-            isWeak=obj['isWeak']
-        )
-        if self.debug:
-            print(f"    ✓  added relation {obj['relationLabel']} between {obj['relationFrom']} and {obj['relationTo']}:")
-            print(f"       fromEdgeLabel = {obj['fromEdgeLabel']}, toEdgeLabel = {obj['toEdgeLabel']}, isWeak = {obj['isWeak']}")
-
-    def __add_obj_copy(self, argument):
-        if self.has_obj(argument.get('label', '')):
-            if self.debug:
-                print(f" ! trying to add object {argument.get('label', '')} of type {argument.get('nodeType', NodeType.NOT_SPECIFIED)}, but already exists")
-            return
-        switcher = {
-            str(NodeType.NODE): "_add_obj_node",
-            str(NodeType.ATTRIBUTE): "_add_obj_attr",
-            str(NodeType.IS_A): "_add_obj_is_a",
-            str(NodeType.RELATION): "_add_obj_rel"
-        }
-        function_name = switcher.get(argument.get('nodeType', NodeType.NOT_SPECIFIED), "not found")
-        if function_name == "not found":
-            raise Exception(f"  no adequate function found to add object copy for type {argument.get('nodeType', NodeType.NOT_SPECIFIED)}")
-        #if self.debug:
-        #    print(f"    calling function {function_name}() to add object copy of type {argument.get('nodeType', NodeType.NOT_SPECIFIED)}")
-        func = getattr(self, function_name, lambda: "Invalid node type")(argument)
-        return func
-
     def mergeGraphsWith(self, otherGraph):
+        '''
+        Add the objects of otherGraph which have no match in this graph, see has_obj.
+        All objects are matched against this graph as it was before the merge in one batch,
+        and against the objects copied before them.
+        The missing objects are copied as they are together with their edges, composed attributes
+        are copied along with their parent attribute.
+        Args:
+            otherGraph(ER): the diagram to merge into this one
+        '''
         if self.debug:
             print(" ")
             print("|-> merging graphs")
-        for n1 in otherGraph.get_obj():
-            if self.has_obj(n1.get("label", "")):
+        graph = self.get_graph()
+        otherNodes = otherGraph.get_graph().nodes
+        labels = list(otherNodes)
+        # label -> None, ordered set of the objects to copy
+        missing = dict()
+        # objects of the other graph can match each other, the first one is copied
+        copied = LabelIndex()
+        for label, obj in zip(labels, self.get_objs(labels)):
+            if len(obj) > 0:
                 continue
-            else:
-                if self.debug:
-                    print(f" >  object '{n1.get('label', '')}' doesn't exist in this graph")
-            if (n1.get('nodeType', NodeType.NOT_SPECIFIED) == str(NodeType.COMPOSED_ATTRIBUTE)):
-                if self.debug:
-                    print(f" -> object copy of {NodeType.COMPOSED_ATTRIBUTE}s not supported directly, copy via parent object instead")
+            nodeType = otherNodes[label].get('nodeType', str(NodeType.NOT_SPECIFIED))
+            if nodeType == str(NodeType.COMPOSED_ATTRIBUTE):
+                # composed attributes are copied if and only if their parent attribute is copied,
+                # a fuzzy match against the parent label must not drop them
+                if otherNodes[label].get('parentLabel', '') not in missing:
+                    continue
+            elif copied.find(label) is not None:
                 continue
-            
             if self.debug:
-                print(f" » checking object '{n1.get('label', '')}' of type {n1.get('nodeType', NodeType.NOT_SPECIFIED)}")
-            self.__add_obj_copy(n1)
-            if self.debug: print(" ")
+                print(f" >  object '{label}' doesn't exist in this graph")
+            missing[label] = None
+            copied.add(label, nodeType)
+        # edges to objects which are matched under another label or not copied are left out
+        skipped = set(label for label in labels
+            if label not in missing and not graph.has_node(label) and 'nodeType' in otherNodes[label])
+        edges = [(fromLabel, toLabel, edge) for fromLabel, toLabel, edge in otherGraph.get_graph().edges(data=True)
+            if (fromLabel in missing or toLabel in missing) and fromLabel not in skipped and toLabel not in skipped
+            and not graph.has_edge(fromLabel, toLabel) and not graph.has_edge(toLabel, fromLabel)]
+        self.__insert_objects([(label, otherNodes[label]) for label in missing], edges)
+
+    def compile(self, scores={}, label = "", node_type = NodeType.NOT_SPECIFIED):
+        '''
+        Prepare this diagram as solution for grading many submissions with the same scores.
+        Args:
+            scores(dict): the scores to grade with, defaults if empty
+            label(str): only grade objects matching this label, see get_obj
+            node_type(NodeType): only grade objects of this type
+        Returns:
+            CompiledSolution: snapshot of this diagram, use its compareGraphs to grade submissions
+        '''
+        if scores == {}:
+            scores = self.get_default_scores()
+        return CompiledSolution(self, scores, label, node_type)
 
-    def compareGraphs(self, otherGraph, label = "", node_type = NodeType.NOT_SPECIFIED, scores={}, debug=False):
+    def compareGraphs(self, otherGraph, label = "", node_type = NodeType.NOT_SPECIFIED, scores={}, debug=False, deductions=None):
         if debug: debugging = True
         else: debugging = self.debug
-        dist = 0
         if debugging:
             print(" ¶ calculating distances between graphs:    ")
         if scores == {}:
@@ -551,181 +829,7 @@ class ER:
                 print("  no scores provided, fallback to default.")
             scores = self.get_default_scores()
 
-
-        for n1 in self.get_obj(label, node_type = node_type):
-            # ignore attributes, will be checked as part of NodeType.NODE
-            thisNodeType = n1.get("nodeType", NodeType.NOT_SPECIFIED)
-            if thisNodeType == str(NodeType.ATTRIBUTE) or thisNodeType == str(NodeType.COMPOSED_ATTRIBUTE):
-                continue
-
-            if debugging:
-                print(f" » testing {n1.get('label', '')}:")
-
-            distancePerProperty = scores['missing_property'][n1.get('nodeType', NodeType.NOT_SPECIFIED)]
-
-            otherGraphHasObjectBool = otherGraph.has_obj(n1["label"], thisNodeType)
-            if thisNodeType == str(NodeType.RELATION):
-                otherGraphHasObjectBool = otherGraph.has_rel_adv(n1)
-
-            # check (by label) if object exists in other graph
-            if not otherGraphHasObjectBool:
-                # not found.
-                if debugging:
-                    print(f"   ✗ {scores['missing_object']:+.2f}, {n1.get('nodeType', NodeType.NOT_SPECIFIED)} '{n1.get('label', '')}' doesn't exist in other graph")
-                dist += scores['missing_object']
-
-                # additionally substract points for missing node attributes
-                if thisNodeType == str(NodeType.NODE):
-                    # get all attributes
-                    x = self.get_attr_and_comp(f"{n1.get('label', '')}.*")
-                    for y in x:
-                        distancePerProperty = scores['missing_property'][str(NodeType.ATTRIBUTE)]
-                        if debugging:
-                            print(f"   ✗ {distancePerProperty:+.2f}, missing {NodeType.ATTRIBUTE} '{y.get('label', '')}' ")
-                        dist += distancePerProperty
-            else:
-                # node exists, check equality and compare
-                if debugging: 
-                    print(f"   ✓        exists")
-                    #print(["test", n1, n1["nodeType"]])
-                    
-                if thisNodeType == str(NodeType.RELATION):
-                    #if debugging: print(f"   checking relation for comparison")
-                    
-                    n2 = otherGraph.get_rel_adv(n1)
-                    #if debugging: print(f"   found {n2['label']}")
-                    if n2 == False:
-                        if debugging: print(f" cannot get relation {n1['label']} for comparison ")
-                        dist += scores['missing_object']
-                        continue
-                else:
-                    n2 = otherGraph.get_obj(n1["label"], n1["nodeType"])
-
-                localDist = self.__compare_two_nodes(n1, n2, 
-                    scores, otherGraph, debugging)
-
-                dist += localDist
-
-                if debugging:
-                    print(f"   =  {dist:.2f}")
-
-        if debugging:
-            print(f" ---------------")
-            print(f"   ∑  {dist:.2f}")        
-        return dist
-
-    def __compare_node_properties(self, thisNode, otherNode, key, debugging):
-        #if debugging: 
-        #    print(f"comparing property[{thisNode.get('label', '')}.{key}]: {thisNode[key]} vs {otherNode[key]}")
-        thisValue = thisNode.get(key, "")
-        otherValue = otherNode.get(key, "")
-        
-        # RELATION: don't check "relation" and "relationLabel" strings
-        if thisNode.get('nodeType', NodeType.NOT_SPECIFIED) == str(NodeType.RELATION): 
-            if key == "relation":
-                return True
-            if key == "relationLabel":
-                return True
-        
-            # RELATION: don't differentiate between letters
-            if  (key == "fromEdgeLabel" or key == "toEdgeLabel") and (otherValue.isalpha() and thisValue.isalpha()):
-                #if debugging: 
-                #    print(f"   // ignoring literal mismatch in edge label {thisValue} vs {otherValue}")
-                return True
-            
-            if thisValue != otherValue:
-                #if debugging: print(f"direct property match {key} fail {thisValue} vs {otherValue}")
-                check = False
-                if key == "relationFrom":
-                    check = (thisNode.get("relationFrom", "") == otherNode.get("relationTo", ""))
-                    #if debugging: print(f'({thisNode.get("relationFrom", "")} == {otherNode.get("relationTo", "")})?')
-                if key == "relationTo":
-                    check = (thisNode.get("relationTo", "") == otherNode.get("relationFrom", ""))
-                    #if debugging: print(f'({thisNode.get("relationTo", "")} == {otherNode.get("relationFrom", "")})?')
-                if key == "fromEdgeLabel":
-                    check = (thisNode.get("fromEdgeLabel", "") == otherNode.get("toEdgeLabel", ""))
-                    #if debugging: print(f'({thisNode.get("fromEdgeLabel", "")} == {otherNode.get("toEdgeLabel", "")})?')
-                if key == "toEdgeLabel":
-                    check = (thisNode.get("toEdgeLabel", "") == otherNode.get("fromEdgeLabel", ""))
-                    #if debugging: print(f'({thisNode.get("toEdgeLabel", "")} == {otherNode.get("fromEdgeLabel", "")})?')
-                if key == "subClasses":
-                    thisSubClasses = thisNode.get("subClasses", [])
-                    otherSubClasses = otherNode.get("subClasses", [])
-                    if isinstance(thisSubClasses, list): thisSubClasses = thisSubClasses.sort()
-                    if isinstance(otherSubClasses, list): otherSubClasses = otherSubClasses.sort()
-                    check = (0.8 <= Util.levenshtein_list_callback(thisSubClasses, otherSubClasses))#(thisSubClasses == otherSubClasses)
-                    if self.debug: 
-                        print(f'({thisNode.get("subClasses", "")} vs. {otherNode.get("subClasses", "")}) @ {check*100:.2f}%')
-                if not check:
-                    #if debugging: print(f"inverse property compare {key} fail {thisValue} vs {otherValue}")
-                    return False
-                else:
-                    return True
-
-            
-        #if thisValue != otherValue:
-        levens_check = Util.levenshtein_str_callback(thisValue, otherValue)
-        if 0.8 >= levens_check:
-            if debugging: 
-                print(f"property compare {key} fail {thisValue} vs {otherValue} @ {levens_check*100:.2f}")
-            return False
-        return True
-
-    def __compare_two_nodes(self, thisNode, otherNode, 
-                        scores, otherGraph, debugging):
-        #if thisNode.get('label', '') != otherNode.get('label', ''):
-        #    if self.debug: print(f"node compare label fail {thisNode.get('label', '')} vs {otherNode.get('label', '')}")
-        #    return False
-
-        # TODO: refactor these items into separate classes with helper functions
-
-        localDist = 0
-
-        if thisNode["nodeType"] == str(NodeType.NODE):
-            # SPECIAL CASE: NodeType.NODE - compare node attributes
-            nodeAttributes = self.get_attr(f"{thisNode.get('label', '')}.*")
-            for localAttr in nodeAttributes:
-                distancePerProperty = scores['missing_property'][str(NodeType.ATTRIBUTE)]
-
-                # is attribute missing?
-                if not otherGraph.has_attr(localAttr.get('label', '')):
-                    if debugging:
-                        print(f"   ✗ {distancePerProperty:+.2f}, missing {NodeType.ATTRIBUTE} '{localAttr.get('label', '')}' ")
-                    localDist += distancePerProperty
-                else:
-                    # exists but check params (isWeak etc.)
-                    otherAttr = otherGraph.get_attr(localAttr.get('label', ''))
-                    for key, value in localAttr.items():
-                        compare = Util.levenshtein_str_callback(value, otherAttr[key])
-                        if compare < 0.8:
-                            if (self.debug): print(f"compare attrs: '{value}' with '{otherAttr[key]}' @ {compare*100:.2f}%")
-                            if debugging:
-                                print(f"   ✗ {distancePerProperty:+.2f}, mismatch@{key}: {value} != {otherAttr[key]} ")
-                            localDist += distancePerProperty
-
-        # compare node properties (isWeak etc.)
-
-        # comparison property keys:
-        _nodeType = thisNode.get('nodeType', NodeType.NOT_SPECIFIED)
-        if _nodeType == str(NodeType.NODE):
-            propertyKeys = ['isMultiple', 'isWeak']
-        if _nodeType == str(NodeType.ATTRIBUTE) or _nodeType == str(NodeType.COMPOSED_ATTRIBUTE):
-            propertyKeys = ['attrLabel', 'parentLabel', 'isPK', 'isMultiple', 'isWeak', 'composedOf']
-        if _nodeType == str(NodeType.IS_A):
-            propertyKeys = ['relation', 'superClassLabel', 'superLabel', 'subLabel', 'isDisjunct', 'subClasses']
-        if _nodeType == str(NodeType.RELATION):
-            propertyKeys = ['relationFrom', 'relationTo', 'fromEdgeLabel', 'toEdgeLabel', 'isWeak']
-        distancePerProperty = scores['missing_property'][_nodeType]
-        for k in propertyKeys:
-            #if debugging: print([thisNode, otherNode])
-            if not self.__compare_node_properties(thisNode, otherNode, k, debugging):
-                if debugging:
-                    print(f"   ✗ {distancePerProperty:+.2f}, property mismatch")
-                localDist += distancePerProperty
-            else:
-                continue
-        
-        return localDist
+        return self.compile(scores, label, node_type).compareGraphs(otherGraph, debugging, deductions)
 
     def print_nodes(self):
         if self.debug:
@@ -755,12 +859,17 @@ class ER:
 
     def has_rel_adv(self, thisNode):
         propertyKeys = ['relationFrom', 'relationTo', 'fromEdgeLabel', 'toEdgeLabel', 'isWeak']
-        x = self.get_obj("", NodeType.RELATION)
+        # relationFrom and relationTo match any relation connected to the same node
+        if thisNode.get('nodeType', NodeType.NOT_SPECIFIED) == str(NodeType.RELATION):
+            for endpoint in (thisNode.get('relationFrom', ''), thisNode.get('relationTo', '')):
+                if len(self.__index.get_relations_between(endpoint, endpoint)) > 0:
+                    return True
+            propertyKeys = ['fromEdgeLabel', 'toEdgeLabel', 'isWeak']
         #if self.debug: print(["testing with ", thisNode])
         for otherNode in self.get_obj("", NodeType.RELATION):
             #if self.debug: print(["testing for ", otherNode])
             for k in propertyKeys:
-                if self.__compare_node_properties(thisNode, otherNode, k, self.debug):
+                if CompiledSolution.compare_node_properties(thisNode, otherNode, k, self.debug):
                     return True
                 else:
                     continue
@@ -785,42 +894,154 @@ class ER:
         """
         if label.endswith(".*"):
             label = label.partition("*")[0]
-        obj_list = []
-
-        for obj in list(self.get_graph().nodes(data=True)):
-            potentialNode = obj[1]
-            potentialNodeType = potentialNode.get("nodeType", NodeType.NOT_SPECIFIED)
-            if ( node_type == NodeType.NOT_SPECIFIED or potentialNodeType == str(node_type) ):
-                #if self.debug: print([f"label={label}  | nodeType={potentialNodeType}", "considering", potentialNode])
-                obj_label = potentialNode.get("label", "")
-                if label == "": 
-                    #if self.debug: print([f"label={label}", "found", potentialNode])
-                    obj_list.append(potentialNode) # get all nodes of this type
-                    continue
-                if label.endswith("."):
-                    #if self.debug: print("wildcard search" + label + "*")
-                    if obj_label.startswith(label):
-                        obj_list.append(potentialNode)
-                    continue
-                if potentialNodeType == str(NodeType.RELATION):
-                    # hackaround: replace the relationLabel away
-                    left, bracket, rest = label.partition("-->")
-                    block, bracket, right = rest.partition("<--")
-                    new_label = left + right
-
-                    left, bracket, rest = obj_label.partition("-->")
-                    block, bracket, right = rest.partition("<--")
-                    new_obj_label = left + right
-                    #if self.debug: print(["checking", new_label, new_obj_label])
-                    #if new_label == new_obj_label:
-                    if new_label == new_obj_label:
-                        return potentialNode
-
-                compare = Util.levenshtein_str_callback(obj_label, label)
-                #if (self.debug): print(f"compare labels: '{obj_label}' with '{label}' @ {compare*100:.2f}%")
-                if compare >= 0.92: # obj_label == label:
-                    return potentialNode
-        return obj_list
+
+        anyType = str(node_type) == str(NodeType.NOT_SPECIFIED)
+        nodeType = None if anyType else str(node_type)
+        graphNodes = self.get_graph().nodes
+
+        if label == "":
+            # get all nodes of this type
+            if anyType:
+                return [obj for _, obj in graphNodes(data=True)]
+            return [graphNodes[obj_label] for obj_label in self.__index.get_labels(nodeType)]
+        if label.endswith("."):
+            # wildcard search label*
+            return [graphNodes[obj_label] for obj_label in self.__index.get_prefixed(label, nodeType)]
+        if anyType and label in graphNodes:
+            return graphNodes[label]
+
+        obj_label = self.__index.find(label, nodeType)
+        if obj_label is None:
+            return []
+        return graphNodes[obj_label]
+
+    def get_objs(self, labels, node_type=NodeType.NOT_SPECIFIED):
+        """
+            Gets the objects of node_type for many labels at once, same result as get_obj for each label.
+            The fuzzy matching of the labels without exact match is done in one batch.
+        """
+        anyType = str(node_type) == str(NodeType.NOT_SPECIFIED)
+        nodeType = None if anyType else str(node_type)
+        graphNodes = self.get_graph().nodes
+
+        objs = [None] * len(labels)
+        lookup = []
+        for i, label in enumerate(labels):
+            if label == "" or label.endswith(".") or label.endswith(".*") or (anyType and label in graphNodes):
+                objs[i] = self.get_obj(label, node_type)
+            else:
+                lookup.append(i)
+        found = self.__index.find_many([labels[i] for i in lookup], nodeType)
+        for i, obj_label in zip(lookup, found):
+            objs[i] = [] if obj_label is None else graphNodes[obj_label]
+        return objs
+
+    def get_hash(self, label):
+        '''
+        get the content hash of an object, the same for objects with the same properties in any diagram.
+        The hash is cached until the object is replaced, modifying a record in place is not noticed.
+        Args:
+            label(str): the exact label of the object
+        Returns:
+            str: hex digest of the properties of the object
+        '''
+        digest = self.__hashes.get(label, None)
+        if digest is None:
+            obj = self.get_graph().nodes[label]
+            if isinstance(obj, ERObject):
+                properties = repr(obj.content())
+            else:
+                # node data of a node which is not an object, e.g. the empty "from" node of a relation
+                properties = repr(sorted(obj.items()))
+            digest = hashlib.blake2b(properties.encode("utf-8"), digest_size=16).hexdigest()
+            self.__hashes[label] = digest
+        return digest
+
+    def __attribute_labels(self, label):
+        '''
+        Returns:
+            list: labels of the attributes of the entity and of their composed attributes
+        '''
+        graphNodes = self.get_graph().nodes
+        parents = {label}
+        attributes = []
+        for nodeType in (str(NodeType.ATTRIBUTE), str(NodeType.COMPOSED_ATTRIBUTE)):
+            for attrLabel in self.__index.get_prefixed(f"{label}.", nodeType):
+                if graphNodes[attrLabel].get('parentLabel', None) in parents:
+                    attributes.append(attrLabel)
+                    parents.add(attrLabel)
+        return attributes
+
+    def get_subtree_hash(self, label):
+        '''
+        get the content hash of an entity together with its attributes and their composed attributes
+        Args:
+            label(str): the exact label of the entity
+        Returns:
+            str: hex digest, equal for entities with the same properties and attributes
+        '''
+        digest = self.__subtreeHashes.get(label, None)
+        if digest is None:
+            subtree = hashlib.blake2b(self.get_hash(label).encode("utf-8"), digest_size=16)
+            for attrLabel in sorted(self.__attribute_labels(label)):
+                subtree.update(f"\0{attrLabel}\0{self.get_hash(attrLabel)}".encode("utf-8"))
+            digest = self.__subtreeHashes[label] = subtree.hexdigest()
+        return digest
+
+    def fingerprint(self, ordered=False):
+        '''
+        get a canonical hash of the objects of this diagram, independent of the order of the add_* calls.
+        It covers the labels, flags, cardinalities and subclasses as they are stored, i.e. cardinalities
+        without spaces and subclasses sorted.
+        Args:
+            ordered(bool): also cover the order the objects were added in. Grading depends on it
+                           when a label fuzzily matches several objects, the one added first is used.
+        Returns:
+            str: hex digest, equal for diagrams with the same objects
+        '''
+        labels = list(self.get_graph().nodes)
+        if not ordered:
+            labels.sort()
+        digest = hashlib.blake2b(digest_size=16)
+        for label in labels:
+            digest.update(f"{label}\0{self.get_hash(label)}\0".encode("utf-8"))
+        return digest.hexdigest()
+
+    def diff(self, other):
+        '''
+        Structural difference to another diagram, objects are matched by their exact label.
+        The objects are compared by their content hashes, entities with the same subtree hash
+        in both diagrams are skipped together with their attributes.
+        Args:
+            other(ER): the diagram to compare to
+        Returns:
+            dict: 'added': labels of the objects only in other,
+                  'removed': labels of the objects only in this diagram,
+                  'changed': label -> {key: (value here, value in other)} for the objects with different properties
+        '''
+        graphNodes = self.get_graph().nodes
+        otherNodes = other.get_graph().nodes
+        unchanged = set()
+        for label in self.__index.get_labels(str(NodeType.NODE)):
+            if label in otherNodes and self.get_subtree_hash(label) == other.get_subtree_hash(label):
+                unchanged.add(label)
+                unchanged.update(self.__attribute_labels(label))
+        delta = {
+            'added': [label for label in otherNodes if label not in graphNodes],
+            'removed': [],
+            'changed': dict()
+        }
+        for label, obj in graphNodes.items():
+            if label in unchanged:
+                continue
+            if label not in otherNodes:
+                delta['removed'].append(label)
+            elif self.get_hash(label) != other.get_hash(label):
+                otherObj = otherNodes[label]
+                keys = list(obj) + [key for key in otherObj if key not in obj]
+                delta['changed'][label] = {key: (obj.get(key, None), otherObj.get(key, None))
+                    for key in keys if obj.get(key, None) != otherObj.get(key, None)}
+        return delta
 
     def get_subtree(self, rootNode):
         """
@@ -842,16 +1063,23 @@ class ER:
     def get_rel_adv(self, thisNode):
         propertyKeys = ['relationFrom', 'relationTo', 'fromEdgeLabel', 'toEdgeLabel', 'isWeak']
         #if self.debug: print([f"testing relation (found {len(self.get_obj("", NodeType.RELATION))} others), this: ", thisNode])
-        for otherNode in self.get_obj("", NodeType.RELATION):
+        if thisNode.get('nodeType', NodeType.NOT_SPECIFIED) == str(NodeType.RELATION):
+            # relationFrom and relationTo have to match in any direction,
+            # so only relations between the same two nodes are candidates
+            candidates = [self.get_graph().nodes[label] for label in 
+                self.__index.get_relations_between(thisNode.get('relationFrom', ''), thisNode.get('relationTo', ''))]
+        else:
+            candidates = self.get_obj("", NodeType.RELATION)
+        for otherNode in candidates:
             #if self.debug: print(["testing relation, other: ", otherNode])
             propertyTestCount = 0
             for k in propertyKeys:
-                propertyTest = self.__compare_node_properties(thisNode, otherNode, k, self.debug)
+                propertyTest = CompiledSolution.compare_node_properties(thisNode, otherNode, k, self.debug)
                 #if self.debug: print(f"testing property {k}, mismatch? {propertyTest}")
                 if propertyTest:
                     propertyTestCount += 1
                 else:
-                    continue
+                    break
             if propertyTestCount == len(propertyKeys):
                 return otherNode
         return False        
@@ -882,23 +1110,153 @@ class ER:
         return len(self.get_obj("", nodeType))
                     
     def get_graphViz(self):
-        return self.graphViz
+        '''
+        Returns:
+            Digraph: the graphviz representation, rebuilt if the graph changed since the last call
+        '''
+        graphViz = self.__graphViz
+        if self.__graphVizDirty or graphViz is None:
+            # built completely before it is shared, concurrent calls may build it more than once
+            graphViz = self.__build_graphviz()
+            self.__graphViz = graphViz
+            self.__graphVizDirty = False
+        return graphViz
+
+    @property
+    def graphViz(self):
+        return self.get_graphViz()
+
+    def __export_graph(self):
+        '''
+        Returns:
+            nx.DiGraph: copy of the graphML graph with plain attribute dicts, lists of labels JSON encoded
+        '''
+        graph = nx.DiGraph()
+        graph.add_nodes_from((label, ERObject.export(obj)) for label, obj in self.get_graph().nodes(data=True))
+        graph.add_edges_from(self.get_graph().edges(data=True))
+        return graph
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the rendering is rebuilt on demand
+        state['_ER__graphViz'] = None
+        state['_ER__graphVizDirty'] = True
+        return state
+
+    def asBytes(self):
+        '''
+        get this diagram in the binary format of save: a header and the zlib compressed JSON of
+        the objects, the edges, the change log and the label index
+        Returns:
+            bytes: the diagram
+        '''
+        state = {
+            'engine': self.engine,
+            'edge_len': self.edge_len,
+            'debug': self.debug,
+            'graph_attr': self.graph_attr,
+            'nodes': [self.__node_state(label, obj) for label, obj in self.get_graph().nodes(data=True)],
+            'edges': [[fromLabel, toLabel, data] for fromLabel, toLabel, data in self.get_graph().edges(data=True)],
+            'revision': self.revision,
+            'changes': list(self.__changes.items()),
+            'index': self.__index.get_state()
+        }
+        payload = zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+        return self.BINARY_MAGIC + struct.pack(">H", self.BINARY_VERSION) + payload
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        restore a diagram from the binary format of save.
+        Only data is decoded, no code is run, so stored submissions can be loaded safely.
+        Args:
+            data(bytes): the output of asBytes
+        Returns:
+            ER: the diagram
+        Raises:
+            ValueError: if the data is not a diagram in this version of the format
+        '''
+        headerLength = len(cls.BINARY_MAGIC) + 2
+        if data[:len(cls.BINARY_MAGIC)] != cls.BINARY_MAGIC:
+            raise ValueError("not an ER diagram in binary format")
+        version, = struct.unpack(">H", data[len(cls.BINARY_MAGIC):headerLength])
+        if version != cls.BINARY_VERSION:
+            raise ValueError(f"unsupported binary format version {version}, expected {cls.BINARY_VERSION}")
+        try:
+            state = json.loads(zlib.decompress(data[headerLength:]))
+            diagram = cls(state['engine'], state['edge_len'], state['debug'], state['graph_attr'])
+            diagram.__restore(state)
+        except (zlib.error, KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"not an ER diagram in binary format: {error}")
+        return diagram
+
+    @staticmethod
+    def __node_state(label, obj):
+        '''
+        Returns:
+            list: label, nodeType and the properties of a node without the derived ones,
+            the nodeType is None for a node which is not an object
+        '''
+        if isinstance(obj, ERObject):
+            return [label, obj.NODE_TYPE, {key: obj[key] for key in obj if key not in obj.DERIVED}]
+        return [label, None, dict(obj)]
+
+    def __restore(self, state):
+        '''
+        restore the objects, the edges, the change log and the label index stored by asBytes
+        Args:
+            state(dict): the decoded state
+        '''
+        graph = self.get_graph()
+        for label, nodeType, properties in state['nodes']:
+            graph.add_node(label)
+            if nodeType is None:
+                graph._node[label].update(properties)
+            else:
+                graph._node[label] = ERObject.create(nodeType, **properties)
+        graph.add_edges_from(state['edges'])
+        self.revision = state['revision']
+        self.__changes = OrderedDict(state['changes'])
+        self.__index = LabelIndex.from_state(state['index'])
+
+    def save(self, path):
+        '''
+        save this diagram in a compact binary format, restored by ER.load without replaying the add_* calls
+        Args:
+            path(str): the file to write
+        '''
+        with open(path, "wb") as f:
+            f.write(self.asBytes())
+
+    @classmethod
+    def load(cls, path):
+        '''
+        load a diagram written by save.
+        Args:
+            path(str): the file to read
+        Returns:
+            ER: the diagram
+        '''
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
 
     def print_graphml(self):
-        for line in nx.generate_graphml(self.get_graph()):
+        for line in nx.generate_graphml(self.__export_graph()):
             print(line)
 
     def write_graphml(self, fname):
-        nx.write_graphml_lxml(self.get_graph(), fname)
+        nx.write_graphml_lxml(self.__export_graph(), fname)
     
     def asGraphvizPlaygroundUrl(self):
         '''
         Returns:
             str(graphviz playground URL)
         '''
-        graphVizCode=str(self.graphViz)
+        from urllib.parse import quote
+        graphViz=self.get_graphViz()
+        graphVizCode=str(graphViz)
         encoded=quote(graphVizCode.encode('utf8'))
-        url=f"http://magjac.com/graphviz-visual-editor/?{self.graphViz.engine}={encoded}"
+        url=f"http://magjac.com/graphviz-visual-editor/?{graphViz.engine}={encoded}"
         return url
     
     def __format_label(self, label, isWeak=False, isPK=False):
@@ -0,0 +1,222 @@
+from erdiagram.NodeType import NodeType
+from collections.abc import MutableMapping
+import json
+
+class ERObject(MutableMapping):
+    '''
+        Compact record of an object of an ER diagram, stored as node data in the graphML graph.
+        The properties are kept in slots instead of a per-object dict; the nodeType and the
+        relation description are derived on access.
+        Records behave like the attribute dicts networkx would store, keys which are not
+        properties of the type are kept in an extra dict.
+    '''
+    __slots__ = ('_extra',)
+
+    # str(NodeType) of the records of this class
+    NODE_TYPE = str(NodeType.NOT_SPECIFIED)
+    # all keys in the order of the attribute dicts
+    KEYS = ()
+    # keys computed from the properties
+    DERIVED = ('nodeType',)
+    # keys holding a tuple of labels, encoded as JSON list on export
+    LIST_KEYS = ()
+    # keys stored in slots, KEYS without DERIVED
+    STORED = ()
+
+    def __init__(self, **properties):
+        '''
+        constructor
+
+        Args:
+            properties(dict): the properties of the object
+        '''
+        self._extra = None
+        # derived keys are compared to the value derived from the other properties
+        for key, value in properties.items():
+            if key not in self.DERIVED:
+                self[key] = value
+        for key in self.DERIVED:
+            if key in properties:
+                self[key] = properties[key]
+
+    @staticmethod
+    def create(nodeType, **properties):
+        '''
+        create the record for an object
+        Args:
+            nodeType(str): str(NodeType) of the object
+            properties(dict): the properties of the object
+        Returns:
+            ERObject: the record
+        '''
+        return ERObject.RECORD_TYPES.get(nodeType, ERObject)(**properties)
+
+    @staticmethod
+    def encode(value):
+        '''
+        encode a tuple of labels the way it is exported
+        Args:
+            value: property value
+        Returns:
+            the JSON list for a tuple, other values unchanged
+        '''
+        if isinstance(value, tuple):
+            return json.dumps(list(value))
+        return value
+
+    @staticmethod
+    def export(obj):
+        '''
+        get the properties of an object for GraphML or node-link export
+        Args:
+            obj(dict): a record or attribute dict
+        Returns:
+            dict: the properties with tuples of labels encoded as JSON lists
+        '''
+        return {key: ERObject.encode(value) for key, value in obj.items()}
+
+    def _derive(self, key):
+        '''
+        Returns:
+            the value of the derived key
+        '''
+        if key == 'nodeType':
+            return self.NODE_TYPE
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if key in self.DERIVED:
+            try:
+                return self._derive(key)
+            except AttributeError:
+                raise KeyError(key)
+        if key in self.KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.LIST_KEYS:
+            # stored as tuple, JSON lists of older exports are decoded once
+            if isinstance(value, str):
+                value = json.loads(value)
+            setattr(self, key, tuple(value))
+        elif key in self.KEYS and key not in self.DERIVED:
+            setattr(self, key, value)
+        elif key in self.DERIVED and (self._extra is None or key not in self._extra) and self._derive(key) == value:
+            return
+        else:
+            if self._extra is None:
+                self._extra = dict()
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if self._extra is not None and key in self._extra:
+            del self._extra[key]
+        elif key in self.KEYS and key not in self.DERIVED and hasattr(self, key):
+            delattr(self, key)
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in self.KEYS:
+            if key in self.DERIVED or hasattr(self, key):
+                if self._extra is None or key not in self._extra:
+                    yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __contains__(self, key):
+        if self._extra is not None and key in self._extra:
+            return True
+        return key in self.DERIVED or (key in self.KEYS and hasattr(self, key))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def content(self):
+        '''
+        get the stored properties in a compact form, e.g. for hashing
+        Returns:
+            tuple: (nodeType, values of the stored keys, sorted extra items), equal for equal records
+        '''
+        # ERObject stands for keys which are not set
+        values = tuple(getattr(self, key, ERObject) for key in self.STORED)
+        extra = None if self._extra is None else tuple(sorted(self._extra.items()))
+        return (self.NODE_TYPE, values, extra)
+
+    def copy(self):
+        '''
+        Returns:
+            ERObject: a shallow copy of this record
+        '''
+        return type(self)(**self)
+
+class NodeObject(ERObject):
+    '''
+        record of an entity
+    '''
+    __slots__ = ('label', 'isMultiple', 'isWeak')
+    NODE_TYPE = str(NodeType.NODE)
+    KEYS = ('label', 'isMultiple', 'isWeak', 'nodeType')
+
+class AttributeObject(ERObject):
+    '''
+        record of an attribute of an entity
+    '''
+    __slots__ = ('label', 'attrLabel', 'parentLabel', 'isPK', 'isMultiple', 'isWeak', 'composedOf')
+    NODE_TYPE = str(NodeType.ATTRIBUTE)
+    KEYS = ('label', 'attrLabel', 'parentLabel', 'isPK', 'isMultiple', 'isWeak', 'composedOf', 'nodeType')
+    LIST_KEYS = ('composedOf',)
+
+class ComposedAttributeObject(AttributeObject):
+    '''
+        record of an attribute an attribute is composed of
+    '''
+    __slots__ = ()
+    NODE_TYPE = str(NodeType.COMPOSED_ATTRIBUTE)
+
+class RelationObject(ERObject):
+    '''
+        record of a relation between two entities
+    '''
+    __slots__ = ('label', 'relationLabel', 'relationFrom', 'relationTo', 'fromEdgeLabel', 'toEdgeLabel', 'isWeak')
+    NODE_TYPE = str(NodeType.RELATION)
+    KEYS = ('label', 'relation', 'relationLabel', 'relationFrom', 'relationTo', 'fromEdgeLabel', 'toEdgeLabel', 'isWeak', 'nodeType')
+    DERIVED = ('relation', 'nodeType')
+
+    def _derive(self, key):
+        if key == 'relation':
+            return f"{self.relationFrom}<-[{self.fromEdgeLabel}]--[{self.toEdgeLabel}]->{self.relationTo}"
+        return super()._derive(key)
+
+class IsAObject(ERObject):
+    '''
+        record of an "is-A" from a superclass to its subclasses
+    '''
+    __slots__ = ('label', 'superClassLabel', 'superLabel', 'subLabel', 'isDisjunct', 'subClasses')
+    NODE_TYPE = str(NodeType.IS_A)
+    KEYS = ('label', 'relation', 'superClassLabel', 'superLabel', 'subLabel', 'isDisjunct', 'subClasses', 'nodeType')
+    DERIVED = ('relation', 'nodeType')
+    LIST_KEYS = ('subClasses',)
+
+    def _derive(self, key):
+        if key == 'relation':
+            subClasses = list(self.subClasses)
+            if self.isDisjunct:
+                return f"{self.superClassLabel}->[{self.superLabel}]->[isA]->[{self.subLabel}]->{subClasses}"
+            return f"{self.superClassLabel}<-[{self.superLabel}]<-[isA]<-[{self.subLabel}]<-{subClasses}"
+        return super()._derive(key)
+
+# str(NodeType) -> record class
+ERObject.RECORD_TYPES = {recordType.NODE_TYPE: recordType for recordType in
+    (NodeObject, AttributeObject, ComposedAttributeObject, RelationObject, IsAObject)}
+for recordType in ERObject.RECORD_TYPES.values():
+    recordType.STORED = tuple(key for key in recordType.KEYS if key not in recordType.DERIVED)
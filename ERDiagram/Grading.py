@@ -0,0 +1,323 @@
+from erdiagram.CompiledSolution import CompiledSolution
+from erdiagram.LabelIndex import LabelIndex
+from erdiagram.NodeType import NodeType
+from erdiagram.Similarity import Similarity
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+import traceback
+
+class GradingResult:
+    '''
+        result of grading one submission against a solution
+    '''
+
+    def __init__(self, distance=None, error=None, deductions=None):
+        '''
+        constructor
+
+        Args:
+            distance(float): the distance calculated by compareGraphs, None on error
+            error(str): the traceback of the exception raised while grading, None on success
+            deductions(list): the deductions the distance is the sum of, see CompiledSolution.deduct
+        '''
+        self.distance = distance
+        self.error = error
+        self.deductions = deductions
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"GradingResult(error={self.error.splitlines()[-1]!r})"
+        return f"GradingResult(distance={self.distance})"
+
+# compiled solution of a worker process, set once by _init_worker
+_worker_solution = None
+
+def _init_worker(compiledSolution):
+    global _worker_solution
+    _worker_solution = compiledSolution
+
+def _grade(compiledSolution, submission):
+    '''
+    grade a submission against a compiled solution
+    Returns:
+        GradingResult: the distance or the error
+    '''
+    try:
+        deductions = []
+        return GradingResult(compiledSolution.compareGraphs(submission, deductions=deductions), deductions=deductions)
+    except Exception:
+        return GradingResult(error=traceback.format_exc())
+
+def _grade_in_worker(submission):
+    return _grade(_worker_solution, submission)
+
+class GradeCache:
+    '''
+        In-memory cache of the results of graded submissions, keyed on
+        (solution fingerprint, submission fingerprint, scores hash).
+        Pass it to grade_many to grade identical submissions once across batches.
+    '''
+
+    def __init__(self):
+        # key -> GradingResult
+        self.results = dict()
+
+    @staticmethod
+    def key(compiledSolution, submission):
+        '''
+        get the cache key for grading a submission
+        Args:
+            compiledSolution(CompiledSolution): the solution
+            submission(ER): the submission
+        Returns:
+            tuple: (solution fingerprint, submission fingerprint, scores hash)
+        '''
+        # the ordered fingerprint as fuzzy matches depend on the order of the objects
+        return (compiledSolution.fingerprint(), submission.fingerprint(ordered=True), compiledSolution.scores_hash())
+
+    def get(self, key):
+        '''
+        Returns:
+            GradingResult: the cached result or None
+        '''
+        return self.results.get(key, None)
+
+    def put_many(self, results):
+        '''
+        add the results of successful gradings
+        Args:
+            results(list): (key, GradingResult) tuples
+        '''
+        self.results.update(results)
+
+    def __len__(self):
+        return len(self.results)
+
+class SQLiteGradeCache(GradeCache):
+    '''
+        Grading results with their deductions persisted in an SQLite database, so that
+        regrading an exercise sheet only grades new or changed submissions.
+        Entries are evicted by age and, beyond the maximal number of entries, oldest first.
+    '''
+
+    def __init__(self, path, maxEntries=None, maxAge=None):
+        '''
+        constructor
+
+        Args:
+            path(str): the database file, created if missing
+            maxEntries(int): the number of results to keep, unlimited if None
+            maxAge(float): the seconds a result is kept, unlimited if None
+        '''
+        import sqlite3
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS grades (
+                solution TEXT, submission TEXT, scores TEXT, distance REAL, deductions TEXT, created REAL,
+                PRIMARY KEY (solution, submission, scores))''')
+            self.connection.execute("CREATE INDEX IF NOT EXISTS grades_created ON grades (created)")
+
+    def get(self, key):
+        query = "SELECT distance, deductions FROM grades WHERE solution = ? AND submission = ? AND scores = ?"
+        params = list(key)
+        if self.maxAge is not None:
+            query += " AND created >= ?"
+            params.append(time.time() - self.maxAge)
+        row = self.connection.execute(query, params).fetchone()
+        if row is None:
+            return None
+        distance, deductions = row
+        return GradingResult(distance, deductions=None if deductions is None else json.loads(deductions))
+
+    def put_many(self, results):
+        now = time.time()
+        rows = [(*key, result.distance, None if result.deductions is None else json.dumps(result.deductions), now)
+            for key, result in results]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.evict()
+
+    def evict(self):
+        '''
+        delete the results older than maxAge and the oldest results beyond maxEntries
+        '''
+        with self.connection:
+            if self.maxAge is not None:
+                self.connection.execute("DELETE FROM grades WHERE created < ?", (time.time() - self.maxAge,))
+            if self.maxEntries is not None:
+                self.connection.execute('''DELETE FROM grades WHERE rowid IN
+                    (SELECT rowid FROM grades ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?)''', (self.maxEntries,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM grades").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def grade_many(solution, submissions, scores={}, workers=None, cache=None):
+    '''
+    Grade many submissions against one solution in parallel.
+    The solution is compiled once and sent to each worker process once.
+    Submissions with the same fingerprint are graded once, see GradeCache.key.
+
+    Args:
+        solution(ER): the solution diagram, or a CompiledSolution (scores are ignored then)
+        submissions(list): the submitted ER diagrams
+        scores(dict): the scores passed to compareGraphs, defaults of the solution if empty
+        workers(int): the number of worker processes, the number of CPUs if None.
+                      With 1 worker the submissions are graded in this process.
+        cache(GradeCache): cache of results to look up and fill, only this batch is deduplicated if None
+    Returns:
+        list: a GradingResult per submission, in submission order
+    '''
+    submissions = list(submissions)
+    if not isinstance(solution, CompiledSolution):
+        solution = solution.compile(scores)
+    if cache is None:
+        cache = GradeCache()
+
+    results = [None] * len(submissions)
+    # key -> indices of the submissions with this key, graded once
+    pending = dict()
+    for i, submission in enumerate(submissions):
+        try:
+            key = cache.key(solution, submission)
+        except Exception:
+            # not a diagram, graded on its own to report the error
+            pending[(None, i)] = [i]
+            continue
+        result = cache.get(key)
+        if result is not None:
+            results[i] = GradingResult(result.distance, deductions=result.deductions)
+        else:
+            pending.setdefault(key, list()).append(i)
+
+    keys = list(pending)
+    graded = _grade_all(solution, [submissions[pending[key][0]] for key in keys], workers)
+    cache.put_many([(key, result) for key, result in zip(keys, graded) if result.error is None and key[0] is not None])
+    for key, result in zip(keys, graded):
+        for i in pending[key]:
+            results[i] = GradingResult(result.distance, result.error, result.deductions)
+    return results
+
+def _grade_all(solution, submissions, workers):
+    '''
+    grade the submissions against the compiled solution, in parallel if more than one worker is used
+    Returns:
+        list: a GradingResult per submission, in submission order
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(submissions)))
+    if workers == 1:
+        return [_grade(solution, submission) for submission in submissions]
+
+    chunksize = max(1, len(submissions) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(solution,)) as executor:
+        return list(executor.map(_grade_in_worker, submissions, chunksize=chunksize))
+
+class IncrementalGrader:
+    '''
+        Grades a submission which is edited step by step, e.g. for live feedback in a notebook.
+        The distance of each object of the solution is kept; grading again only looks up the
+        labels and grades the objects of the solution which the objects added or replaced in the
+        submission since the last call can match, see ER.get_changes.
+        Records of the submission modified in place are not noticed.
+    '''
+
+    def __init__(self, solution, submission, scores={}):
+        '''
+        constructor
+
+        Args:
+            solution(ER): the solution diagram, or a CompiledSolution (scores are ignored then)
+            submission(ER): the submission to grade, edited with add_* calls between gradings
+            scores(dict): the scores passed to compareGraphs, defaults of the solution if empty
+        '''
+        if not isinstance(solution, CompiledSolution):
+            solution = solution.compile(scores)
+        self.solution = solution
+        self.submission = submission
+        # revision of the submission at the last grading, None before the first one
+        self.revision = None
+        # distance per object of the solution
+        self.distances = [0] * len(solution.objects)
+        # (nodeType, label) -> matching object of the submission, see CompiledSolution.match
+        self.matches = dict()
+        # nodeType -> index of the labels looked up in the submission
+        self.lookups = dict()
+        for nodeType, labels in solution.lookups.items():
+            index = self.lookups[nodeType] = LabelIndex()
+            for label in labels:
+                index.add(label, nodeType)
+        # (nodeType, label) -> indices of the objects graded with the match of the label
+        self.dependents = dict()
+        # node label -> indices of the relations connected to it, graded with the relations of the submission
+        self.relationsByEndpoint = dict()
+        for i, (obj, nodeType, attributes, allAttributeLabels) in enumerate(solution.objects):
+            if nodeType == str(NodeType.RELATION):
+                for endpoint in (obj.get('relationFrom', ''), obj.get('relationTo', '')):
+                    self.relationsByEndpoint.setdefault(endpoint, set()).add(i)
+            else:
+                self.dependents.setdefault((nodeType, obj['label']), set()).add(i)
+            for attrLabel, attrItems in attributes:
+                self.dependents.setdefault((str(NodeType.ATTRIBUTE), attrLabel), set()).add(i)
+
+    def __affected(self, changed):
+        '''
+        find what the changed objects of the submission can affect
+        Args:
+            changed(list): labels of the changed objects
+        Returns:
+            tuple: (nodeType -> labels to look up again, indices of the objects to grade again)
+        '''
+        lookups = dict()
+        objects = set()
+        otherNodes = self.submission.get_graph().nodes
+        for changedLabel in changed:
+            # a label can only become the match of labels it matches exactly or fuzzily,
+            # the types are not checked as a replaced object may have changed its type
+            for nodeType, index in self.lookups.items():
+                labels = [label for label in index.get_fuzzy_candidates(changedLabel, nodeType)
+                    if label == changedLabel or Similarity.is_similar(changedLabel, label, LabelIndex.FUZZY_THRESHOLD)]
+                lookups.setdefault(nodeType, dict()).update((label, None) for label in labels)
+            obj = otherNodes[changedLabel]
+            if obj.get('nodeType', None) == str(NodeType.RELATION):
+                for endpoint in (obj.get('relationFrom', ''), obj.get('relationTo', '')):
+                    objects.update(self.relationsByEndpoint.get(endpoint, ()))
+        for nodeType, labels in lookups.items():
+            for label in labels:
+                objects.update(self.dependents.get((nodeType, label), ()))
+        return {nodeType: list(labels) for nodeType, labels in lookups.items() if len(labels) > 0}, objects
+
+    def distance(self, debug=False):
+        '''
+        grade the submission in its current state
+        Args:
+            debug(bool): print the deductions of the objects graded again
+        Returns:
+            float: the distance, same as compareGraphs of the solution
+        '''
+        if self.revision is None:
+            self.matches = self.solution.match(self.submission)
+            objects = range(len(self.distances))
+        else:
+            lookups, objects = self.__affected(self.submission.get_changes(self.revision))
+            self.matches.update(self.solution.match(self.submission, lookups))
+        self.revision = self.submission.revision
+        for i in sorted(objects):
+            self.distances[i] = self.solution.grade_object(i, self.submission, self.matches, debug)
+        dist = 0
+        for objectDistance in self.distances:
+            dist += objectDistance
+        return dist
@@ -0,0 +1,344 @@
+from erdiagram.NodeType import NodeType
+from erdiagram.Similarity import Similarity
+import bisect
+import math
+
+class LabelIndex:
+    '''
+        Label index for the objects of an ER diagram, grouped by NodeType.
+        Maintained on insert, answers exact label lookups without scanning the graph.
+    '''
+
+    # minimal levenshtein ratio for a fuzzy label match
+    FUZZY_THRESHOLD = 0.92
+    # minimal number of label pairs to compare in one batch with Similarity.matrix
+    MATRIX_MIN_PAIRS = 4096
+
+    def __init__(self):
+        # label -> nodeType, in insertion order of the graph
+        self.nodeTypes = dict()
+        # nodeType -> {label: None}, ordered set of labels per type
+        self.labels = dict()
+        # relation labels without the relationLabel part -> relation labels
+        self.relationEndpoints = dict()
+        # label -> insertion sequence number
+        self.sequence = dict()
+        self.__nextSequence = 0
+        # nodeType -> {length of sanitized label: {label: None}}, prefilter for fuzzy matches
+        self.lengths = dict()
+        # label -> nodeType of the labels not yet in self.lengths, bucketed on the first fuzzy lookup
+        self.__unbucketed = dict()
+        # nodeType -> sorted list of labels, for wildcard queries on label prefixes
+        self.sortedLabels = dict()
+        # relation label -> (fromNodeLabel, toNodeLabel)
+        self.relationSignatures = dict()
+        # node label -> {labels of the relations connected to it: None}
+        self.relationsByEndpoint = dict()
+
+    @staticmethod
+    def _endpoint_key(label):
+        '''
+        strip the relation label from a label of form {from}-->{relation}<--{to}
+        Args:
+            label(str): label to strip
+        Returns:
+            str: {from}{to}
+        '''
+        left, bracket, rest = label.partition("-->")
+        block, bracket, right = rest.partition("<--")
+        return left + right
+
+    @staticmethod
+    def _length_key(label):
+        '''
+        Returns:
+            int: length of the label as compared by the levenshtein callback
+        '''
+        return len(Similarity.sanitize(label))
+
+    @staticmethod
+    def candidate_lengths(length, threshold):
+        '''
+        get the label lengths which can reach the threshold against a label of the given length.
+        The levenshtein ratio is 1 - distance / (length + otherLength) and the distance
+        is at least the difference in length.
+        Args:
+            length(int): length of the sanitized label
+            threshold(float): minimal levenshtein ratio
+        Returns:
+            range: possible lengths of matching labels
+        '''
+        if threshold <= 0:
+            return None
+        lo = math.ceil(length * threshold / (2 - threshold) - 1e-9)
+        hi = math.floor(length * (2 - threshold) / threshold + 1e-9)
+        return range(max(lo, 0), hi + 1)
+
+    def add(self, label, nodeType, endpoints=None):
+        '''
+        add an object label to the index
+        Args:
+            label(str): label of the object (= key in the graph)
+            nodeType(str): str(NodeType) of the object
+            endpoints(tuple): (fromNodeLabel, toNodeLabel) of a relation
+        '''
+        oldType = self.nodeTypes.get(label, None)
+        if oldType == nodeType and self.relationSignatures.get(label, None) == endpoints:
+            return
+        if oldType is not None:
+            self.remove(label)
+        self.nodeTypes[label] = nodeType
+        self.labels.setdefault(nodeType, dict())[label] = None
+        if label not in self.sequence:
+            self.sequence[label] = self.__nextSequence
+            self.__nextSequence += 1
+        self.__unbucketed[label] = nodeType
+        bisect.insort(self.sortedLabels.setdefault(nodeType, list()), label)
+        if nodeType == str(NodeType.RELATION):
+            self.relationEndpoints.setdefault(self._endpoint_key(label), dict())[label] = None
+        if endpoints is not None:
+            self.relationSignatures[label] = endpoints
+            for endpoint in set(endpoints):
+                self.relationsByEndpoint.setdefault(endpoint, dict())[label] = None
+
+    def remove(self, label):
+        '''
+        remove an object label from the index
+        Args:
+            label(str): label of the object
+        '''
+        nodeType = self.nodeTypes.pop(label, None)
+        if nodeType is None:
+            return
+        self.labels[nodeType].pop(label, None)
+        if self.__unbucketed.pop(label, None) is None:
+            self.lengths[nodeType][self._length_key(label)].pop(label, None)
+        sortedLabels = self.sortedLabels[nodeType]
+        del sortedLabels[bisect.bisect_left(sortedLabels, label)]
+        if nodeType == str(NodeType.RELATION):
+            key = self._endpoint_key(label)
+            self.relationEndpoints[key].pop(label, None)
+            if len(self.relationEndpoints[key]) == 0:
+                del self.relationEndpoints[key]
+        endpoints = self.relationSignatures.pop(label, None)
+        if endpoints is not None:
+            for endpoint in set(endpoints):
+                self.relationsByEndpoint[endpoint].pop(label, None)
+
+    def copy(self):
+        '''
+        Returns:
+            LabelIndex: an independent copy of this index
+        '''
+        index = LabelIndex()
+        index.nodeTypes = self.nodeTypes.copy()
+        index.labels = {nodeType: labels.copy() for nodeType, labels in self.labels.items()}
+        index.relationEndpoints = {key: labels.copy() for key, labels in self.relationEndpoints.items()}
+        index.sequence = self.sequence.copy()
+        index.__nextSequence = self.__nextSequence
+        index.lengths = {nodeType: {length: labels.copy() for length, labels in buckets.items()}
+            for nodeType, buckets in self.lengths.items()}
+        index.__unbucketed = self.__unbucketed.copy()
+        index.sortedLabels = {nodeType: labels.copy() for nodeType, labels in self.sortedLabels.items()}
+        index.relationSignatures = self.relationSignatures.copy()
+        index.relationsByEndpoint = {label: labels.copy() for label, labels in self.relationsByEndpoint.items()}
+        return index
+
+    def get_state(self):
+        '''
+        get the state of this index from which from_state rebuilds it, made of lists, dicts and strings only
+        Returns:
+            dict: the labels with their type in index order, the relation endpoints and the insertion sequence
+        '''
+        return {
+            'nodeTypes': [[label, nodeType] for label, nodeType in self.nodeTypes.items()],
+            'relationSignatures': {label: list(endpoints) for label, endpoints in self.relationSignatures.items()},
+            'sequence': self.sequence,
+            'nextSequence': self.__nextSequence
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        '''
+        rebuild an index from the output of get_state without comparing any labels
+        Args:
+            state(dict): the state of the index
+        Returns:
+            LabelIndex: the index
+        '''
+        index = cls()
+        relationType = str(NodeType.RELATION)
+        for label, endpoints in state['relationSignatures'].items():
+            index.relationSignatures[label] = tuple(endpoints)
+        for label, nodeType in state['nodeTypes']:
+            index.nodeTypes[label] = nodeType
+            index.labels.setdefault(nodeType, dict())[label] = None
+            index.__unbucketed[label] = nodeType
+            index.sortedLabels.setdefault(nodeType, list()).append(label)
+            if nodeType == relationType:
+                index.relationEndpoints.setdefault(cls._endpoint_key(label), dict())[label] = None
+        # the relations of an endpoint in the order their signatures were added
+        for label, endpoints in index.relationSignatures.items():
+            for endpoint in set(endpoints):
+                index.relationsByEndpoint.setdefault(endpoint, dict())[label] = None
+        for sortedLabels in index.sortedLabels.values():
+            sortedLabels.sort()
+        index.sequence = dict(state['sequence'])
+        index.__nextSequence = state['nextSequence']
+        return index
+
+    def get_type(self, label):
+        '''
+        Returns:
+            str: str(NodeType) of the object with exactly this label or None
+        '''
+        return self.nodeTypes.get(label, None)
+
+    def get_labels(self, nodeType=None):
+        '''
+        get all labels of the given type in insertion order
+        Args:
+            nodeType(str): str(NodeType) to filter for, None for all types
+        Returns:
+            list: labels
+        '''
+        if nodeType is None:
+            return list(self.nodeTypes)
+        return list(self.labels.get(nodeType, ()))
+
+    def get_relations_between(self, fromNodeLabel, toNodeLabel):
+        '''
+        get the relations connecting both nodes in any direction.
+        For fromNodeLabel == toNodeLabel these are all relations connected to the node.
+        Args:
+            fromNodeLabel(str): label of one endpoint
+            toNodeLabel(str): label of the other endpoint
+        Returns:
+            list: relation labels in insertion order
+        '''
+        fromRelations = self.relationsByEndpoint.get(fromNodeLabel, dict())
+        toRelations = self.relationsByEndpoint.get(toNodeLabel, dict())
+        if len(toRelations) < len(fromRelations):
+            fromRelations, toRelations = toRelations, fromRelations
+        return [label for label in fromRelations if label in toRelations]
+
+    def get_prefixed(self, prefix, nodeType=None):
+        '''
+        get all labels starting with the prefix, e.g. all attributes of an entity for prefix "{label}."
+        Args:
+            prefix(str): prefix of the labels
+            nodeType(str): str(NodeType) to filter for, None for all types
+        Returns:
+            list: labels in insertion order
+        '''
+        if nodeType is None:
+            sortedLists = list(self.sortedLabels.values())
+        else:
+            sortedLists = [self.sortedLabels.get(nodeType, [])]
+        found = []
+        for sortedLabels in sortedLists:
+            i = bisect.bisect_left(sortedLabels, prefix)
+            while i < len(sortedLabels) and sortedLabels[i].startswith(prefix):
+                found.append(sortedLabels[i])
+                i += 1
+        found.sort(key=self.sequence.__getitem__)
+        return found
+
+    def get_fuzzy_candidates(self, label, nodeType=None, threshold=FUZZY_THRESHOLD):
+        '''
+        get the labels which can possibly reach the threshold, judged by their length
+        Args:
+            label(str): label to look for
+            nodeType(str): str(NodeType) to filter for, None for all types
+            threshold(float): minimal levenshtein ratio
+        Returns:
+            list: candidate labels in insertion order
+        '''
+        lengths = self.candidate_lengths(self._length_key(label), threshold)
+        if lengths is None:
+            return self.get_labels(nodeType)
+        self.__bucket_lengths()
+        if nodeType is None:
+            buckets = list(self.lengths.values())
+        else:
+            buckets = [self.lengths.get(nodeType, dict())]
+        candidates = []
+        for bucket in buckets:
+            for length in lengths:
+                candidates.extend(bucket.get(length, ()))
+        candidates.sort(key=self.sequence.__getitem__)
+        return candidates
+
+    def __bucket_lengths(self):
+        '''
+        sort the labels added since the last fuzzy lookup into the length buckets.
+        Done lazily as computing the length needs the levenshtein sanitizer.
+        '''
+        for label, nodeType in self.__unbucketed.items():
+            self.lengths.setdefault(nodeType, dict()).setdefault(self._length_key(label), dict())[label] = None
+        self.__unbucketed.clear()
+
+    def __find_exact(self, label, nodeType=None):
+        foundType = self.nodeTypes.get(label, None)
+        if foundType is not None and (nodeType is None or foundType == nodeType):
+            return label
+
+        # relations match on their endpoints, regardless of the relation label
+        if nodeType is None or nodeType == str(NodeType.RELATION):
+            relations = self.relationEndpoints.get(self._endpoint_key(label), None)
+            if relations:
+                return next(iter(relations))
+        return None
+
+    def find_many(self, labels, nodeType=None, threshold=FUZZY_THRESHOLD):
+        '''
+        find the objects matching many labels, same results as find for each label.
+        If numpy is available, the fuzzy comparisons of the labels without exact match are
+        done in one batch with Similarity.matrix.
+        Args:
+            labels(list): labels to look for
+            nodeType(str): str(NodeType) to filter for, None for all types
+            threshold(float): minimal levenshtein ratio of a fuzzy match
+        Returns:
+            list: label of the matching object or None, for each label
+        '''
+        found = [self.__find_exact(label, nodeType) for label in labels]
+        misses = [i for i, match in enumerate(found) if match is None]
+        candidates = self.get_labels(nodeType)
+        # same order as the fuzzy candidates of find, a type change keeps the sequence number
+        candidates.sort(key=self.sequence.__getitem__)
+        if not Similarity.has_matrix() or len(misses) * len(candidates) < self.MATRIX_MIN_PAIRS:
+            for i in misses:
+                found[i] = self.find(labels[i], nodeType, threshold)
+            return found
+
+        ratios = Similarity.matrix([labels[i] for i in misses], candidates)
+        # the matrix is a prefilter, the threshold is checked exactly for the candidates it passes
+        passed = ratios >= threshold - 1e-9
+        for row, i in enumerate(misses):
+            for column in passed[row].nonzero()[0]:
+                if Similarity.is_similar(candidates[column], labels[i], threshold):
+                    found[i] = candidates[column]
+                    break
+        return found
+
+    def find(self, label, nodeType=None, threshold=FUZZY_THRESHOLD):
+        '''
+        find the object matching the label: exact matches are answered directly,
+        the fuzzy levenshtein comparison is only done on a miss and only against
+        the labels whose length allows to reach the threshold.
+        Args:
+            label(str): label to look for
+            nodeType(str): str(NodeType) to filter for, None for all types
+            threshold(float): minimal levenshtein ratio of a fuzzy match
+        Returns:
+            str: label of the matching object or None
+        '''
+        exact = self.__find_exact(label, nodeType)
+        if exact is not None:
+            return exact
+
+        for candidate in self.get_fuzzy_candidates(label, nodeType, threshold):
+            if Similarity.is_similar(candidate, label, threshold):
+                return candidate
+        return None
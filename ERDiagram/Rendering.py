@@ -0,0 +1,234 @@
+from erdiagram.Corpus import _named
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+class RenderResult:
+    '''
+        result of rendering one diagram
+    '''
+
+    def __init__(self, path=None, error=None):
+        '''
+        constructor
+
+        Args:
+            path(str): the file written, None on error
+            error(str): why the diagram could not be rendered, None on success
+        '''
+        self.path = path
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"RenderResult(error={self.error.splitlines()[-1]!r})"
+        return f"RenderResult(path={self.path!r})"
+
+def render(diagram, path, format='svg', timeout=None, source=None):
+    '''
+    render a diagram to a file with the graphviz engine of the diagram, in a dot subprocess
+    Args:
+        diagram(ER): the diagram to render
+        path(str): the file to write
+        format(str): the graphviz output format, e.g. svg, png or pdf
+        timeout(float): the seconds after which the subprocess is killed, no limit if None
+        source(str): the DOT source of the diagram if already generated
+    Returns:
+        str: the path
+    Raises:
+        subprocess.TimeoutExpired: if rendering took longer than the timeout
+        subprocess.CalledProcessError: if graphviz failed
+        OSError: if graphviz is not installed
+    '''
+    if source is None:
+        source = diagram.get_graphViz().source
+    subprocess.run(["dot", f"-K{diagram.engine}", f"-T{format}", "-o", path], input=source.encode("utf-8"),
+        capture_output=True, timeout=timeout, check=True)
+    return path
+
+class RenderCache:
+    '''
+        Renderings on disk, addressed by the sha256 of the DOT source, the engine and the format.
+        Diagrams with the same DOT source are rendered once; the least recently used files are
+        deleted when the total size exceeds maxBytes.
+    '''
+
+    def __init__(self, directory, maxBytes=None):
+        '''
+        constructor
+
+        Args:
+            directory(str): the directory of the cache, created if missing
+            maxBytes(int): the total size of the cached files, unlimited if None
+        '''
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+        self.__lock = threading.Lock()
+        # file name -> size, least recently used first
+        self.files = OrderedDict()
+        self.size = 0
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.startswith(".")]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self.files[entry.name] = entry.stat().st_size
+            self.size += entry.stat().st_size
+
+    @staticmethod
+    def key(source, engine, format):
+        '''
+        Returns:
+            str: sha256 hex digest of the rendering
+        '''
+        return hashlib.sha256(f"{engine}\0{format}\0{source}".encode("utf-8")).hexdigest()
+
+    def get(self, source, engine, format, target=None):
+        '''
+        look up a rendering
+        Args:
+            source(str): the DOT source
+            engine(str): the graphviz engine
+            format(str): the graphviz output format
+            target(str): if given, the cached file is copied there before it can be evicted
+        Returns:
+            str: the path of the cached file or None
+        '''
+        name = f"{self.key(source, engine, format)}.{format}"
+        path = os.path.join(self.directory, name)
+        with self.__lock:
+            if name not in self.files:
+                return None
+            self.files.move_to_end(name)
+            try:
+                # the modification time orders the files when the cache is opened again
+                os.utime(path)
+                if target is not None:
+                    shutil.copyfile(path, target)
+            except FileNotFoundError:
+                # deleted by another process sharing the directory
+                self.size -= self.files.pop(name, 0)
+                return None
+        return path
+
+    def render(self, diagram, format='svg', timeout=None, target=None, source=None):
+        '''
+        get the rendering of a diagram, rendered with render() on a cache miss.
+        With maxBytes the returned file can be evicted by later renderings, pass a target to keep a copy.
+        Args:
+            diagram(ER): the diagram to render
+            format(str): the graphviz output format
+            timeout(float): the seconds after which the subprocess is killed, no limit if None
+            target(str): if given, the cached file is copied there before it can be evicted
+            source(str): the DOT source of the diagram if already generated, the key of the cache
+        Returns:
+            str: the path of the cached file
+        '''
+        if source is None:
+            source = diagram.get_graphViz().source
+        path = self.get(source, diagram.engine, format, target)
+        if path is not None:
+            return path
+        name = f"{self.key(source, diagram.engine, format)}.{format}"
+        path = os.path.join(self.directory, name)
+        fd, tmpPath = tempfile.mkstemp(prefix=".", dir=self.directory)
+        os.close(fd)
+        try:
+            render(diagram, tmpPath, format, timeout, source)
+        except BaseException:
+            os.remove(tmpPath)
+            raise
+        with self.__lock:
+            os.replace(tmpPath, path)
+            size = os.path.getsize(path)
+            self.size += size - self.files.pop(name, 0)
+            self.files[name] = size
+            if target is not None:
+                shutil.copyfile(path, target)
+            self.__evict()
+        return path
+
+    def evict(self):
+        '''
+        delete the least recently used files until the total size is at most maxBytes
+        '''
+        with self.__lock:
+            self.__evict()
+
+    def __evict(self):
+        if self.maxBytes is None:
+            return
+        # the file added last is kept even if it is larger than maxBytes
+        while self.size > self.maxBytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+def _render(diagram, source, path, format, timeout, cache=None):
+    '''
+    render a diagram, catching the errors
+    Args:
+        source(str): the DOT source of the diagram, generated by the calling thread
+    Returns:
+        RenderResult: the path or the error
+    '''
+    try:
+        if cache is not None:
+            # copied by the cache, another thread can evict the file right after
+            cache.render(diagram, format, timeout, target=path, source=source)
+            return RenderResult(path)
+        return RenderResult(render(diagram, path, format, timeout, source))
+    except subprocess.TimeoutExpired:
+        return RenderResult(error=f"{diagram.engine} timed out after {timeout} s")
+    except subprocess.CalledProcessError as error:
+        return RenderResult(error=f"{diagram.engine} failed with exit code {error.returncode}: {error.stderr.decode('utf-8', 'replace').strip()}")
+    except Exception as error:
+        return RenderResult(error=f"{type(error).__name__}: {error}")
+
+def render_many(diagrams, format='svg', out_dir='.', workers=None, timeout=60, cache=None):
+    '''
+    Render many diagrams to files, each with the graphviz engine chosen in its constructor.
+    Each diagram is rendered by a graphviz subprocess, at most workers of them run at the same time.
+    A diagram which fails or times out gets an error in its result, the others are rendered anyway.
+
+    Args:
+        diagrams(iterable): ER diagrams or (name, ER) tuples, written to {out_dir}/{name}.{format},
+                            the position in diagrams is used as name if none is given
+        format(str): the graphviz output format, e.g. svg, png or pdf
+        out_dir(str): the directory to write to, created if missing
+        workers(int): the number of diagrams rendered at the same time, the number of CPUs if None
+        timeout(float): the seconds after which rendering a diagram is aborted, no limit if None
+        cache(RenderCache): if given, diagrams are only rendered on a cache miss and copied from the cache
+    Returns:
+        list: a RenderResult per diagram, in order of diagrams
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    items = []
+    for i, (name, diagram) in enumerate(_named(diagrams)):
+        if name is None:
+            name = str(i)
+        # the DOT is generated here once, the threads only run graphviz
+        try:
+            source = diagram.get_graphViz().source
+        except Exception as error:
+            results.append(RenderResult(error=f"{type(error).__name__}: {error}"))
+            continue
+        results.append(None)
+        items.append((i, diagram, source, os.path.join(out_dir, f"{name}.{format}")))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(items)))
+
+    # the threads only wait for the graphviz subprocesses, the diagrams don't need to be pickled
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(i, executor.submit(_render, diagram, source, path, format, timeout, cache)) for i, diagram, source, path in items]
+        for i, future in futures:
+            results[i] = future.result()
+    return results
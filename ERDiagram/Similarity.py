@@ -0,0 +1,183 @@
+from functools import lru_cache
+
+# excmanager and numpy are loaded on first use, excmanager imports IPython
+_util = None
+_numpy = None
+
+def _get_util():
+    global _util
+    if _util is None:
+        from excmanager.Util import Util
+        _util = Util
+    return _util
+
+def _get_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            # numpy is optional, it is only needed for Similarity.matrix
+            _numpy = False
+    return _numpy
+
+@lru_cache(maxsize=1 << 16)
+def _cached_ratio(a, b):
+    return _get_util().levenshtein_str_callback(a, b)
+
+class Similarity:
+    '''
+        Memoized levenshtein similarity of labels and property values,
+        as computed by excmanager's Util.levenshtein_str_callback.
+    '''
+
+    @staticmethod
+    def sanitize(value):
+        '''
+        Returns:
+            str: the value as compared by the levenshtein callback (lowercase, stripped, umlauts replaced)
+        '''
+        return _get_util().str_sanitize(value)
+
+    @staticmethod
+    def ratio(a, b):
+        '''
+        levenshtein ratio of the sanitized string representations, memoized on the pair
+        Args:
+            a: first value
+            b: second value
+        Returns:
+            float: similarity between 0 and 1
+        '''
+        a = str(a)
+        b = str(b)
+        # the ratio is symmetric, store each pair once
+        if b < a:
+            a, b = b, a
+        return _cached_ratio(a, b)
+
+    @staticmethod
+    def is_similar(a, b, threshold, strict=False):
+        '''
+        check if the levenshtein ratio reaches the threshold.
+        Stops early if the values are identical or if the difference in length
+        alone rules out reaching the threshold.
+        Args:
+            a: first value
+            b: second value
+            threshold(float): minimal ratio
+            strict(bool): if True the ratio has to be above the threshold
+        Returns:
+            bool: True if ratio >= threshold (ratio > threshold if strict)
+        '''
+        if a == b and type(a) == type(b):
+            ratio = 1.0
+        else:
+            sanitize = _get_util().str_sanitize
+            lenA = len(sanitize(a))
+            lenB = len(sanitize(b))
+            lenSum = lenA + lenB
+            if lenSum > 0:
+                # the distance is at least the difference in length
+                maxRatio = (lenSum - abs(lenA - lenB)) / lenSum
+                if maxRatio < threshold or (strict and maxRatio == threshold):
+                    return False
+            ratio = Similarity.ratio(a, b)
+        if strict:
+            return ratio > threshold
+        return ratio >= threshold
+
+    @staticmethod
+    def has_matrix():
+        '''
+        Returns:
+            bool: True if numpy is available for Similarity.matrix
+        '''
+        return bool(_get_numpy())
+
+    @staticmethod
+    def matrix(labels, otherLabels):
+        '''
+        levenshtein ratios of all label pairs, computed in one batch with numpy.
+        The ratio is 2 * LCS / (len(a) + len(b)) of the sanitized labels, the LCS is
+        computed bit-parallel for all pairs at once (Hyyrö 2004).
+        Values may differ from Similarity.ratio in the last digit, confirm threshold
+        decisions with Similarity.is_similar.
+
+        Args:
+            labels(list): labels of the rows
+            otherLabels(list): labels of the columns
+        Returns:
+            numpy.ndarray: len(labels) x len(otherLabels) matrix of ratios
+        '''
+        np = _get_numpy()
+        if not np:
+            raise ImportError("Similarity.matrix requires numpy")
+        sanitize = _get_util().str_sanitize
+        rows = [sanitize(label) for label in labels]
+        columns = [sanitize(label) for label in otherLabels]
+        result = np.empty((len(rows), len(columns)))
+
+        # the columns are encoded as bit masks, longer labels don't fit a machine word
+        wordColumns = [j for j, column in enumerate(columns) if len(column) <= 64]
+        for j, column in enumerate(columns):
+            if len(column) > 64:
+                result[:, j] = [Similarity.ratio(row, column) for row in rows]
+        if len(rows) == 0 or len(wordColumns) == 0:
+            return result
+
+        # characters of the row labels, the last index is used for padding and never matches
+        alphabet = dict()
+        for row in rows:
+            for c in row:
+                alphabet.setdefault(c, len(alphabet))
+        columnMasks = []
+        for j in wordColumns:
+            charMask = dict()
+            for pos, c in enumerate(columns[j]):
+                charMask[c] = charMask.get(c, 0) | (1 << pos)
+            columnMasks.append(charMask)
+        masks = np.array([[charMask.get(c, 0) for charMask in columnMasks] for c in alphabet] + [[0] * len(wordColumns)], dtype=np.uint64)
+        lowBits = np.array([(1 << len(columns[j])) - 1 for j in wordColumns], dtype=np.uint64)
+        rowLengths = np.array([len(row) for row in rows])
+        columnLengths = np.array([len(columns[j]) for j in wordColumns])
+        width = rowLengths.max()
+        rowChars = np.full((len(rows), width), len(alphabet), dtype=np.intp)
+        for i, row in enumerate(rows):
+            rowChars[i, :len(row)] = [alphabet[c] for c in row]
+
+        blockSize = max(1, (1 << 20) // len(wordColumns))
+        for start in range(0, len(rows), blockSize):
+            block = rowChars[start:start + blockSize]
+            v = np.full((len(block), len(wordColumns)), np.iinfo(np.uint64).max, dtype=np.uint64)
+            for i in range(width):
+                match = masks[block[:, i]]
+                u = v & match
+                v = (v + u) | (v - u)
+            lcs = Similarity.__bit_count(~v & lowBits)
+            lengthSum = rowLengths[start:start + blockSize, None] + columnLengths[None, :]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = np.where(lengthSum > 0, 1 - (lengthSum - 2 * lcs) / lengthSum, 1.0)
+            result[start:start + blockSize, wordColumns] = ratios
+        return result
+
+    @staticmethod
+    def __bit_count(words):
+        np = _get_numpy()
+        if hasattr(np, 'bitwise_count'):
+            return np.bitwise_count(words).astype(np.int64)
+        byteCounts = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+        return byteCounts[words.view(np.uint8).reshape(words.shape + (8,))].sum(axis=-1)
+
+    @staticmethod
+    def cache_info():
+        '''
+        Returns:
+            CacheInfo: statistics of the memoized ratios
+        '''
+        return _cached_ratio.cache_info()
+
+    @staticmethod
+    def cache_clear():
+        _cached_ratio.cache_clear()
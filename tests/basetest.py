@@ -4,6 +4,7 @@ Created on 2021-08-19
 @author: wf
 '''
 from unittest import TestCase
+from erdiagram.ER import ER
 import time
 
 class Basetest(TestCase):
@@ -25,6 +26,40 @@ class Basetest(TestCase):
         TestCase.tearDown(self)
         self.profiler.time()    
 
+    def getExampleDiagram(self, engine='dot', isWeak=False, modelLabel='Modell'):
+        '''
+        get the example diagram shared by the tests: a manufacturer with a composed address
+        developing models of two kinds
+
+        Args:
+            engine(str): the graphviz engine to use
+            isWeak(bool): is the relation weak?
+            modelLabel(str): label of the model entity
+        Returns:
+            ER: the diagram
+        '''
+        g = ER(engine=engine)
+        g.add_attribute('Hersteller', 'Adresse', composedOf = ['PLZ', 'Ort'])
+        g.add_relation('Hersteller', 'entwickelt', modelLabel, '1', 'n', isWeak = isWeak)
+        g.add_is_a(modelLabel, ['3D', '2D'], superLabel = 'p', isDisjunct = False)
+        return g
+
+    def getExampleDiagrams(self, count, modelLabel='Modell'):
+        '''
+        generate variants of the example diagram one at a time,
+        the i-th one has the key attribute Name{i} and a weak relation if i is even
+
+        Args:
+            count(int): the number of diagrams
+            modelLabel(str): label of the model entity
+        Returns:
+            generator: the diagrams
+        '''
+        for i in range(count):
+            g = self.getExampleDiagram(isWeak = i % 2 == 0, modelLabel = modelLabel)
+            g.add_attribute('Hersteller', f'Name{i}', isPK = True)
+            yield g
+
 class Profiler:
     '''
     simple profiler
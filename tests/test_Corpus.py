@@ -0,0 +1,43 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+from erdiagram.Corpus import write_jsonl, read_jsonl, write_graphml_many, read_graphml_many
+import io
+import os
+import tempfile
+
+class TestCorpus(Basetest):
+    '''
+      test exporting many diagrams as one stream
+    '''
+
+    # label of the model entity with characters to be escaped in XML
+    MODEL_LABEL = 'Modell <&>'
+
+    def assertSameDiagrams(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for g, h in zip(expected, actual):
+            self.assertEqual(list(g.get_graph().nodes(data=True)), list(h.get_graph().nodes(data=True)))
+            self.assertEqual(sorted(g.get_graph().edges(data=True)), sorted(h.get_graph().edges(data=True)))
+            self.assertEqual(g.get_graphViz().source, h.get_graphViz().source)
+
+    def testJsonl(self):
+        stream = io.StringIO()
+        self.assertEqual(3, write_jsonl(self.getExampleDiagrams(3, self.MODEL_LABEL), stream))
+        self.assertEqual(3, len(stream.getvalue().splitlines()))
+        stream.seek(0)
+        diagrams = list(read_jsonl(stream))
+        self.assertEqual([None, None, None], [name for name, diagram in diagrams])
+        self.assertSameDiagrams(list(self.getExampleDiagrams(3, self.MODEL_LABEL)), [diagram for name, diagram in diagrams])
+
+    def testGraphML(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'corpus.graphml')
+            named = ((f"submission {i}", g) for i, g in enumerate(self.getExampleDiagrams(3, self.MODEL_LABEL)))
+            self.assertEqual(3, write_graphml_many(named, path))
+            diagrams = list(read_graphml_many(path))
+        self.assertEqual(["submission 0", "submission 1", "submission 2"], [name for name, diagram in diagrams])
+        self.assertSameDiagrams(list(self.getExampleDiagrams(3, self.MODEL_LABEL)), [diagram for name, diagram in diagrams])
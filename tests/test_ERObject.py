@@ -0,0 +1,83 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+from erdiagram.ER import ER
+from erdiagram.ERObject import ERObject, RelationObject
+from erdiagram.NodeType import NodeType
+import pickle
+
+class TestERObject(Basetest):
+    '''
+      test the compact records of the ER objects
+    '''
+
+    def getDiagram(self):
+        g = ER()
+        g.add_attribute("Person", "Adresse", composedOf=["PLZ", "Ort"])
+        g.add_relation("Person", "wohnt", "Ort", "n", "1")
+        g.add_is_a("Person", ["Student", "Mitarbeiter"], "t", "p", isDisjunct=False)
+        return g
+
+    def testRecordsLikeDicts(self):
+        g = self.getDiagram()
+        relation = g.get_rel("Person-->wohnt<--Ort")
+        self.assertIsInstance(relation, RelationObject)
+        self.assertEqual({
+            'label': "Person-->wohnt<--Ort",
+            'relation': "Person<-[n]--[1]->Ort",
+            'relationLabel': "wohnt",
+            'relationFrom': "Person",
+            'relationTo': "Ort",
+            'fromEdgeLabel': "n",
+            'toEdgeLabel': "1",
+            'isWeak': False,
+            'nodeType': str(NodeType.RELATION)
+        }, dict(relation))
+        self.assertEqual(list(dict(relation)), list(relation.keys()))
+        isA = g.get_isA("Person.isA.['Mitarbeiter', 'Student']")
+        self.assertEqual("Person<-[t]<-[isA]<-[p]<-['Mitarbeiter', 'Student']", isA['relation'])
+        self.assertEqual(str(NodeType.COMPOSED_ATTRIBUTE), g.get_comp_attr("Person.Adresse.PLZ")['nodeType'])
+        self.assertEqual(dict(isA), isA)
+        self.assertEqual(len(dict(isA)), len(isA))
+        self.assertEqual(relation, relation.copy())
+
+    def testExtraKeys(self):
+        record = ERObject.create(str(NodeType.NODE), label="Person", isMultiple=False, isWeak=False)
+        record['comment'] = "extra"
+        record['isWeak'] = True
+        self.assertEqual(['label', 'isMultiple', 'isWeak', 'nodeType', 'comment'], list(record))
+        self.assertTrue(record['isWeak'])
+        del record['comment']
+        self.assertNotIn('comment', record)
+        with self.assertRaises(KeyError):
+            record['comment']
+        self.assertIsNone(record.get('comment'))
+        copy = record.copy()
+        copy['isMultiple'] = True
+        self.assertFalse(record['isMultiple'])
+
+    def testPickle(self):
+        g = self.getDiagram()
+        other = pickle.loads(pickle.dumps(g))
+        self.assertEqual(g.get_obj(), other.get_obj())
+        self.assertEqual(0, g.compareGraphs(other))
+
+    def testListsOfLabels(self):
+        g = self.getDiagram()
+        self.assertEqual(("PLZ", "Ort"), g.get_attr("Person.Adresse")['composedOf'])
+        # exported as JSON lists
+        nodes = {node['id']: node for node in g.asSolution()['nodes']}
+        self.assertEqual('["PLZ", "Ort"]', nodes["Person.Adresse"]['composedOf'])
+        self.assertEqual('["Mitarbeiter", "Student"]', nodes["Person.isA.['Mitarbeiter', 'Student']"]['subClasses'])
+        # JSON lists of older exports are decoded
+        record = ERObject.create(str(NodeType.ATTRIBUTE), composedOf='["PLZ", "Ort"]')
+        self.assertEqual(("PLZ", "Ort"), record['composedOf'])
+        h = ER()
+        h.add_attribute("Person", "Adresse", composedOf='["Ort", "PLZ"]')
+        h.add_relation("Person", "wohnt", "Ort", "n", "1")
+        h.add_is_a("Person", ("Mitarbeiter", "Student"), "t", "p", isDisjunct=False)
+        # the order of composedOf is compared as before, on the JSON encoding
+        self.assertEqual(g.get_default_scores()['missing_property'][str(NodeType.ATTRIBUTE)], g.compareGraphs(h))
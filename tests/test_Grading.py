@@ -0,0 +1,169 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+from erdiagram.ER import ER
+from erdiagram.Grading import grade_many, GradeCache, GradingResult, IncrementalGrader, SQLiteGradeCache
+from erdiagram.NodeType import NodeType
+import os
+import tempfile
+
+class TestGrading(Basetest):
+    '''
+      test batch grading of ER diagrams
+    '''
+
+    def getSolution(self):
+        solution = ER()
+        solution.add_node('Hersteller')
+        solution.add_attribute('Hersteller', 'Name', isPK = True)
+        solution.add_attribute('Hersteller', 'Sitz')
+        solution.add_relation('Hersteller', 'entwickelt', 'Modell', '1', 'n')
+        solution.add_is_a('Modell', ['3D', '2D'], superLabel = 'p', isDisjunct = False)
+        return solution
+
+    def getSubmissions(self):
+        submissions = []
+        empty = ER()
+        submissions.append(empty)
+        partial = ER()
+        partial.add_node('Hersteller', isWeak = True)
+        partial.add_attribute('Hersteller', 'Name')
+        partial.add_relation('Modell', 'wird entwickelt', 'Hersteller', 'n', '1')
+        submissions.append(partial)
+        submissions.append(self.getSolution())
+        return submissions
+
+    def testGradeMany(self):
+        solution = self.getSolution()
+        submissions = self.getSubmissions()
+        expected = [solution.compareGraphs(submission) for submission in submissions]
+        for workers in [1, 2]:
+            results = grade_many(solution, submissions, workers = workers)
+            self.assertEqual(expected, [result.distance for result in results])
+            self.assertEqual([None] * len(submissions), [result.error for result in results])
+
+    def testGradeManyError(self):
+        solution = self.getSolution()
+        submissions = self.getSubmissions()
+        submissions.insert(1, "not a diagram")
+        results = grade_many(solution, submissions, workers = 2)
+        self.assertEqual(len(submissions), len(results))
+        self.assertIsNone(results[1].distance)
+        self.assertIn("AttributeError", results[1].error)
+        self.assertEqual(0, results[3].distance)
+
+    def testCompiledSolution(self):
+        solution = self.getSolution()
+        submissions = self.getSubmissions()
+        scores = {
+            'missing_object': 0.5,
+            'missing_property': {
+                str(NodeType.NODE): 0.5,
+                str(NodeType.ATTRIBUTE): 0.5,
+                str(NodeType.RELATION): 0.25,
+                str(NodeType.IS_A): 0.25
+            }
+        }
+        expected = [solution.compareGraphs(submission, scores=scores) for submission in submissions]
+        compiled = solution.compile(scores)
+        self.assertEqual(expected, [compiled.compareGraphs(submission) for submission in submissions])
+        self.assertEqual(expected, [result.distance for result in grade_many(compiled, submissions, workers = 1)])
+
+        # the compiled solution is a snapshot
+        solution.add_node('Käse')
+        self.assertEqual(expected, [compiled.compareGraphs(submission) for submission in submissions])
+        self.assertEqual(expected[0] + 0.5, solution.compareGraphs(submissions[0], scores=scores))
+
+    def testLabelFilter(self):
+        solution = self.getSolution()
+        partial = self.getSubmissions()[1]
+        compiled = solution.compile(label = 'Hersteller')
+        self.assertEqual(1, len(compiled.objects))
+        # Hersteller is weak and the attribute Name is no primary key, Sitz is missing
+        distance = 0.5 + 0.25 + 0.25
+        self.assertEqual(distance, compiled.compareGraphs(partial))
+        self.assertEqual(distance, solution.compareGraphs(partial, label = 'Hersteller'))
+        self.assertEqual(1 + 0.25 + 0.25, solution.compareGraphs(ER(), label = 'Hersteller'))
+
+    def testIncrementalGrader(self):
+        solution = self.getSolution()
+        submission = ER()
+        grader = IncrementalGrader(solution, submission)
+        self.assertEqual(solution.compareGraphs(submission), grader.distance())
+        revision = submission.revision
+        steps = [
+            lambda: submission.add_node('Hersteller', isWeak = True),
+            lambda: submission.add_attribute('Hersteller', 'Nmae'),
+            lambda: submission.add_attribute('Hersteller', 'Name', isPK = True),
+            lambda: submission.add_relation('Modell', 'wird entwickelt', 'Hersteller', 'n', '1'),
+            lambda: submission.add_node('Hersteller'),
+            lambda: submission.add_attribute('Hersteller', 'Sitz'),
+            lambda: submission.add_is_a('Modell', ['3D', '2D'], superLabel = 'p', isDisjunct = False),
+            lambda: submission.mergeGraphsWith(solution)
+        ]
+        for step in steps:
+            step()
+            self.assertEqual(solution.compareGraphs(submission), grader.distance())
+        self.assertEqual(0, grader.distance())
+        self.assertEqual(['Hersteller.Nmae', 'Hersteller.Name', 'Modell', 'Modell-->wird entwickelt<--Hersteller'],
+            submission.get_changes(revision)[:4])
+        self.assertEqual([], submission.get_changes(submission.revision))
+
+    def testGradeCache(self):
+        solution = self.getSolution()
+        submissions = self.getSubmissions()
+        expected = [solution.compareGraphs(submission) for submission in submissions]
+        copies = [ER.from_bytes(submission.asBytes()) for submission in submissions]
+        cache = GradeCache()
+        results = grade_many(solution, submissions + copies + ["not a diagram"], workers = 1, cache = cache)
+        self.assertEqual(expected + expected, [result.distance for result in results[:-1]])
+        self.assertIn("AttributeError", results[-1].error)
+        self.assertEqual(len(submissions), len(cache))
+        # graded again from the cache only
+        cache.put_many([(key, GradingResult(42)) for key in cache.results])
+        self.assertEqual([42] * len(copies), [result.distance for result in grade_many(solution, copies, workers = 2, cache = cache)])
+        # other scores are other keys
+        scores = solution.get_default_scores()
+        scores = dict(scores, missing_object = 2)
+        self.assertEqual(solution.compareGraphs(submissions[0], scores = scores), grade_many(solution, submissions[:1], scores = scores, cache = cache)[0].distance)
+        self.assertEqual(len(submissions) + 1, len(cache))
+
+    def testDeductions(self):
+        solution = self.getSolution()
+        partial = self.getSubmissions()[1]
+        deductions = []
+        distance = solution.compareGraphs(partial, deductions = deductions)
+        self.assertEqual(distance, sum(deduction['points'] for deduction in deductions))
+        self.assertIn({'label': 'Hersteller', 'key': 'isWeak', 'points': 0.5}, deductions)
+        self.assertIn({'label': 'Hersteller.Sitz', 'key': None, 'points': 0.25}, deductions)
+        self.assertIn({'label': 'Hersteller.Name', 'key': 'isPK', 'points': 0.25}, deductions)
+        self.assertEqual(deductions, grade_many(solution, [partial], workers = 1)[0].deductions)
+
+    def testSQLiteGradeCache(self):
+        solution = self.getSolution()
+        submissions = self.getSubmissions()
+        expected = grade_many(solution, submissions, workers = 1)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'grades.sqlite')
+            with SQLiteGradeCache(path) as cache:
+                grade_many(solution, submissions, workers = 1, cache = cache)
+                self.assertEqual(len(submissions), len(cache))
+            # a rerun reads the results of the first run
+            with SQLiteGradeCache(path) as cache:
+                key = cache.key(solution.compile(), submissions[1])
+                self.assertEqual(expected[1].deductions, cache.get(key).deductions)
+                cache.put_many([(key, GradingResult(42, deductions = []))])
+                results = grade_many(solution, submissions, workers = 1, cache = cache)
+                self.assertEqual([expected[0].distance, 42, expected[2].distance], [result.distance for result in results])
+            # eviction by size keeps the newest results, by age drops all
+            with SQLiteGradeCache(path, maxEntries = 1) as cache:
+                cache.evict()
+                self.assertEqual(1, len(cache))
+                self.assertEqual(42, cache.get(key).distance)
+            with SQLiteGradeCache(path, maxAge = -1) as cache:
+                self.assertIsNone(cache.get(key))
+                cache.evict()
+                self.assertEqual(0, len(cache))
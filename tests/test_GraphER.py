@@ -6,7 +6,14 @@ Created on 2022-01-12
 from tests.basetest import Basetest
 from erdiagram.ER import ER
 from erdiagram.NodeType import NodeType
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import zlib
 class TestGraphER(Basetest):
     '''
       test graph handling for ER Diagrams
@@ -219,7 +226,7 @@ class TestGraphER(Basetest):
         self.assertEqual(self.superLabel, added_isA["superLabel"])
         self.assertEqual(self.subLabel, added_isA["subLabel"])
         self.assertEqual(True, added_isA["isDisjunct"])
-        self.assertEqual(json.dumps(self.otherNodeLabelList), added_isA["subClasses"]) # graph translates params to string
+        self.assertEqual(tuple(self.otherNodeLabelList), added_isA["subClasses"])
 
 
     def testAddIsAComposed(self):
@@ -235,7 +242,7 @@ class TestGraphER(Basetest):
         self.assertEqual(self.superLabel, added_isA["superLabel"])
         self.assertEqual(self.subLabel, added_isA["subLabel"])
         self.assertEqual(True, added_isA["isDisjunct"])
-        self.assertEqual(json.dumps(self.isAList), added_isA["subClasses"]) # graph translates params to string
+        self.assertEqual(tuple(self.isAList), added_isA["subClasses"])
 
     def testAddTernaryRelation(self):
         g = ER()
@@ -607,4 +614,314 @@ class TestGraphER(Basetest):
         h = ER(debug=True)
         h.add_is_a("A", ["C", "D", "B"], "t", isDisjunct = True)
         self.assertEqual(0, h.compareGraphs(g, debug = True))
-        
\ No newline at end of file
+        
+    def testGetObjExactMatchFirst(self):
+        g = ER()
+        g.add_node("Bewertungs")
+        g.add_node("Bewertung")
+
+        # exact hit wins over an earlier fuzzy match
+        self.assertEqual("Bewertung", g.get_node("Bewertung")["label"])
+        self.assertEqual("Bewertungs", g.get_node("Bewertungs")["label"])
+        # fuzzy fallback on a miss
+        self.assertEqual("Bewertungs", g.get_node("bewertungs ")["label"])
+        self.assertEqual([], g.get_node("Schule"))
+        # exact lookups respect the node type
+        self.assertFalse(g.has_attr("Bewertung"))
+
+    def testGradingExactMatchFirst(self):
+        '''
+        an object of the solution is graded against the submission object with exactly its label,
+        the lookup used to take the first fuzzy match in insertion order and scored 1 here
+        '''
+        solution = ER()
+        solution.add_relation('Artikel', 'kauft', 'Kunden', '1', 'n')
+        submission = ER()
+        submission.add_relation('Kunden', 'kauft', 'Artikels', '1', 'n')
+        submission.add_node('Artikel', isWeak = True)
+        deductions = []
+        self.assertEqual(1.5, solution.compareGraphs(submission, deductions = deductions))
+        self.assertIn({'label': 'Artikel', 'key': 'isWeak', 'points': 0.5}, deductions)
+
+    def testGetObjLargeGraph(self):
+        g = ER()
+        for i in range(2000):
+            g.add_node(f"Entity_{i}")
+            g.add_attribute(f"Entity_{i}", "ID", isPK=True)
+        self.assertEqual(2000, g.get_obj_count(NodeType.NODE))
+        self.assertEqual(2000, g.get_obj_count(NodeType.ATTRIBUTE))
+        self.assertTrue(g.has_attr("Entity_1999.ID"))
+        self.assertEqual("Entity_42", g.get_node("Entity_42")["label"])
+
+    def testGetAttrWildcard(self):
+        g = ER()
+        g.add_attribute("Person", "Name")
+        g.add_attribute("Personal", "Nummer")
+        g.add_attribute("Person", "Adresse", composedOf=["PLZ", "Ort"])
+
+        attrs = [attr["label"] for attr in g.get_attr("Person.*")]
+        self.assertEqual(["Person.Name", "Person.Adresse"], attrs)
+        attrs = [attr["label"] for attr in g.get_attr_and_comp("Person.*")]
+        self.assertEqual(["Person.Name", "Person.Adresse", "Person.Adresse.PLZ", "Person.Adresse.Ort"], attrs)
+
+    def testRelationInverseDirection(self):
+        g = ER()
+        g.add_relation('Patient', 'besucht', 'Arzt', 'm', '(1,1)')
+        g.add_relation('Arzt', 'behandelt', 'Station', '1', 'n')
+
+        h = ER()
+        h.add_relation('Arzt', 'wird besucht', 'Patient', '(1,1)', 'm')
+        h.add_relation('Station', 'hat', 'Arzt', 'n', '1')
+
+        self.assertEqual('Arzt-->wird besucht<--Patient', h.get_rel_adv(g.get_rel('Patient-->besucht<--Arzt'))['label'])
+        self.assertEqual('Station-->hat<--Arzt', h.get_rel_adv(g.get_rel('Arzt-->behandelt<--Station'))['label'])
+        self.assertEqual(0, g.compareGraphs(h))
+
+        h.add_relation('Patient', 'liegt auf', 'Station', '(1,1)', 'n')
+        self.assertFalse(g.get_rel_adv(h.get_rel('Patient-->liegt auf<--Station')))
+        self.assertTrue(g.has_rel_adv(h.get_rel('Patient-->liegt auf<--Station')))
+
+    def testGraphVizLazy(self):
+        g = ER(engine='neato')
+        g.add_node('Hersteller')
+        g.add_attribute('Hersteller', 'Name', isPK = True)
+
+        graphViz = g.get_graphViz()
+        self.assertIs(graphViz, g.get_graphViz())
+        self.assertEqual('neato', graphViz.engine)
+        self.assertIn('"Hersteller.Name" [label=<<U>Name</U>>]', graphViz.source)
+
+        # changes invalidate the cached rendering
+        g.add_is_a('Hersteller', ['Bauer', 'Fabrik'], superLabel = 'p', isDisjunct = False)
+        self.assertIsNot(graphViz, g.get_graphViz())
+        self.assertIn('is_A0 -> Bauer', g.get_graphViz().source)
+        self.assertIn('neato=', g.asGraphvizPlaygroundUrl())
+
+    def testFromSpec(self):
+        g = ER()
+        g.add_node('Hersteller')
+        g.add_attribute('Hersteller', 'Name', isPK = True)
+        g.add_attribute('Hersteller', 'Adresse', composedOf = ['PLZ', 'Ort'])
+        g.add_relation('Hersteller', 'entwickelt', 'Modell', '1', 'n', isWeak = True)
+        g.add_is_a('Modell', ['3D', '2D'], superLabel = 'p', isDisjunct = False)
+
+        h = ER.from_spec(
+            entities = ['Hersteller'],
+            attributes = [
+                ('Hersteller', 'Name', True),
+                {'nodeLabel': 'Hersteller', 'attrLabel': 'Adresse', 'composedOf': ['PLZ', 'Ort']}
+            ],
+            relations = [('Hersteller', 'entwickelt', 'Modell', '1', 'n', True)],
+            isAs = [{'superClassLabel': 'Modell', 'subclassParam': ['3D', '2D'], 'superLabel': 'p', 'isDisjunct': False}]
+        )
+        self.assertEqual(g.get_node_count(), h.get_node_count())
+        self.assertEqual(sorted(g.get_graph().nodes(data=True)), sorted(h.get_graph().nodes(data=True)))
+        self.assertEqual(sorted(g.get_graph().edges(data=True)), sorted(h.get_graph().edges(data=True)))
+        # missing nodes are created like add_relation would do
+        self.assertTrue(h.get_node('Modell')['isWeak'])
+        self.assertEqual(0, g.compareGraphs(h))
+        self.assertEqual(0, h.compareGraphs(g))
+
+    def testSaveLoad(self):
+        g = self.getExampleDiagram(engine = 'neato', isWeak = True)
+        g.get_graphViz()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'diagram.erd')
+            g.save(path)
+            h = ER.load(path)
+        self.assertEqual('neato', h.engine)
+        self.assertEqual(list(g.get_graph().nodes(data=True)), list(h.get_graph().nodes(data=True)))
+        self.assertEqual(list(g.get_graph().edges(data=True)), list(h.get_graph().edges(data=True)))
+        self.assertEqual(g.get_graphViz().source, h.get_graphViz().source)
+        self.assertEqual(0, g.compareGraphs(h))
+        # the label index is restored as well
+        self.assertEqual('Hersteller.Adresse', h.get_attr('Hersteller.Adrese')['label'])
+        h.add_attribute('Modell', 'Name')
+        self.assertTrue(h.has_attr('Modell.Name'))
+        self.assertFalse(g.has_attr('Modell.Name'))
+        with self.assertRaises(ValueError):
+            ER.from_bytes(b'no diagram')
+        with self.assertRaises(ValueError):
+            ER.from_bytes(ER.BINARY_MAGIC + b'\xff\xff' + g.asBytes()[len(ER.BINARY_MAGIC) + 2:])
+
+    def testLoadRunsNoCode(self):
+        '''
+        a payload which is not the stored state of a diagram, e.g. a pickle, is rejected without running it
+        '''
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'keep')
+            open(path, 'w').close()
+            class Payload:
+                def __reduce__(self):
+                    return (os.remove, (path,))
+            header = ER.BINARY_MAGIC + struct.pack(">H", ER.BINARY_VERSION)
+            with self.assertRaises(ValueError):
+                ER.from_bytes(header + zlib.compress(pickle.dumps(Payload())))
+            self.assertTrue(os.path.exists(path))
+        # other versions of the format are rejected
+        data = self.getExampleDiagram().asBytes()
+        with self.assertRaises(ValueError):
+            ER.from_bytes(ER.BINARY_MAGIC + struct.pack(">H", ER.BINARY_VERSION - 1) + data[len(ER.BINARY_MAGIC) + 2:])
+
+    def testFromNodeLinkAndGraphML(self):
+        g = self.getExampleDiagram(isWeak = True)
+        data = g.asSolution()
+        # networkx < 3.4 names the edges "links"
+        links = dict(data)
+        links['links'] = links.pop('edges')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'diagram.graphml')
+            g.write_graphml(path)
+            fromGraphML = ER.read_graphml(path)
+        for h in [ER.from_node_link(data), ER.from_node_link(json.dumps(data)), ER.from_node_link(links), fromGraphML]:
+            self.assertEqual(list(g.get_graph().nodes(data=True)), list(h.get_graph().nodes(data=True)))
+            self.assertEqual(sorted(g.get_graph().edges(data=True)), sorted(h.get_graph().edges(data=True)))
+            self.assertEqual(g.get_graphViz().source, h.get_graphViz().source)
+            self.assertTrue(h.has_comp_attr('Hersteller.Adresse.PLZ'))
+            self.assertEqual(0, g.compareGraphs(h))
+
+    def testClone(self):
+        g = self.getExampleDiagram(isWeak = True)
+        source = g.get_graphViz().source
+
+        h = g.clone()
+        self.assertEqual(list(g.get_graph().nodes(data=True)), list(h.get_graph().nodes(data=True)))
+        self.assertEqual(list(g.get_graph().edges(data=True)), list(h.get_graph().edges(data=True)))
+        self.assertEqual(source, h.get_graphViz().source)
+        self.assertEqual(0, g.compareGraphs(h))
+
+        # changes don't propagate in either direction
+        h.add_attribute('Modell', 'Name', isPK = True)
+        h.add_node('Hersteller', isWeak = True)
+        g.add_relation('Modell', 'nutzt', 'Teil', 'n', 'm')
+        self.assertFalse(g.has_attr('Modell.Name'))
+        self.assertFalse(g.get_node('Hersteller')['isWeak'])
+        self.assertTrue(h.get_node('Hersteller')['isWeak'])
+        self.assertFalse(h.has_node('Teil'))
+        self.assertFalse(h.get_graph().has_edge('Modell', 'Modell-->nutzt<--Teil'))
+        self.assertIn('Modell.Name', h.get_graphViz().source)
+        self.assertNotIn('Modell.Name', g.get_graphViz().source)
+
+    def testCopyFrom(self):
+        g = self.getExampleDiagram()
+        h = ER.copyfrom(g, engine = 'neato')
+        self.assertEqual('neato', h.engine)
+        self.assertEqual(g.get_obj_count(), h.get_obj_count())
+        self.assertEqual(0, g.compareGraphs(h))
+
+    def testMergeGraphs(self):
+        g = ER()
+        g.add_attribute('Mitarbeiter', 'Name', isPK = True)
+        g.add_relation('Mitarbeiter', 'wohnt', 'Ort', 'n', '1')
+        h = ER()
+        h.add_node('Mitarbeitr')
+        h.add_node('Mitarbeiter')
+        h.add_attribute('Mitarbeiter', 'Adresse', composedOf = ['PLZ', 'Ort'])
+        h.add_attribute('Mitarbeiter', 'adresse')
+        h.add_relation('Mitarbeiter', 'kauft', 'Auto', 'n', 'm')
+        h.add_is_a('Auto', ['PKW', 'LKW'], 't', 'p')
+
+        g.mergeGraphsWith(h)
+        # objects matching this graph or an object copied before are not copied
+        self.assertFalse(g.get_graph().has_node('Mitarbeitr'))
+        self.assertFalse(g.get_graph().has_node('Mitarbeiter.adresse'))
+        # composed attributes are copied along with their parent
+        self.assertEqual(['Mitarbeiter.Adresse.PLZ', 'Mitarbeiter.Adresse.Ort'], [attr['label'] for attr in g.get_comp_attr('Mitarbeiter.Adresse.*')])
+        self.assertTrue(g.get_graph().has_edge('Mitarbeiter.Adresse', 'Mitarbeiter.Adresse.Ort'))
+        self.assertTrue(g.get_graph().has_edge('Mitarbeiter', 'Mitarbeiter-->kauft<--Auto'))
+        self.assertTrue(g.has_isA("Auto.isA.['LKW', 'PKW']"))
+        # merging again adds nothing
+        count = g.get_node_count()
+        g.mergeGraphsWith(h)
+        self.assertEqual(count, g.get_node_count())
+
+    def testMergeComposedOfLongLabel(self):
+        # the composed attributes fuzzily match their long parent label
+        h = ER()
+        h.add_attribute('Studentenausweise', 'Adressen', composedOf = ['PLZ', 'Ort', 'Strasse'])
+        g = ER()
+        g.mergeGraphsWith(h)
+        composed = ['Studentenausweise.Adressen.PLZ', 'Studentenausweise.Adressen.Ort', 'Studentenausweise.Adressen.Strasse']
+        self.assertEqual(composed, [attr['label'] for attr in g.get_comp_attr('Studentenausweise.Adressen.*')])
+        for label in composed:
+            self.assertTrue(g.get_graph().has_edge('Studentenausweise.Adressen', label))
+        self.assertEqual(0, h.compareGraphs(g))
+
+    def testDiff(self):
+        g = self.getExampleDiagram()
+        g.add_attribute('Modell', 'Name', isPK = True)
+        self.assertEqual({'added': [], 'removed': [], 'changed': {}}, g.diff(g.clone()))
+
+        h = g.clone()
+        hash = h.get_subtree_hash('Hersteller')
+        self.assertEqual(hash, g.get_subtree_hash('Hersteller'))
+        h.add_attribute('Hersteller', 'Adresse', composedOf = ['PLZ', 'Ort', 'Straße'])
+        h.add_node('Modell', isWeak = True)
+        h.add_node('Teil')
+        self.assertNotEqual(hash, h.get_subtree_hash('Hersteller'))
+        self.assertEqual(g.get_hash('Hersteller'), h.get_hash('Hersteller'))
+        self.assertEqual({
+            'added': ['Hersteller.Adresse.Straße', 'Teil'],
+            'removed': [],
+            'changed': {
+                'Hersteller.Adresse': {'composedOf': (('PLZ', 'Ort'), ('PLZ', 'Ort', 'Straße'))},
+                'Modell': {'isWeak': (False, True)}
+            }
+        }, g.diff(h))
+        delta = h.diff(g)
+        self.assertEqual(['Hersteller.Adresse.Straße', 'Teil'], delta['removed'])
+        self.assertEqual({'isWeak': (True, False)}, delta['changed']['Modell'])
+
+    def testFingerprint(self):
+        g = self.getExampleDiagram()
+        # the same diagram built in another order
+        h = ER()
+        h.add_is_a('Modell', ['2D', '3D'], superLabel = 'p', isDisjunct = False)
+        h.add_relation('Hersteller', 'entwickelt', 'Modell', '1 ', ' n')
+        h.add_attribute('Hersteller', 'Adresse', composedOf = ['PLZ', 'Ort'])
+        self.assertEqual(g.fingerprint(), h.fingerprint())
+        self.assertNotEqual(g.fingerprint(ordered=True), h.fingerprint(ordered=True))
+        self.assertEqual(g.fingerprint(ordered=True), ER.from_bytes(g.asBytes()).fingerprint(ordered=True))
+        h.add_node('Modell', isWeak = True)
+        self.assertNotEqual(g.fingerprint(), h.fingerprint())
+
+    def testLeanDot(self):
+        g = ER()
+        for attrLabel in ['Name', 'Sitz', 'Gründung', 'Umsatz']:
+            g.add_attribute('Hersteller', attrLabel)
+        g.add_attribute('Hersteller', 'Telefon', isMultiple = True)
+        g.add_relation('Hersteller', 'entwickelt', 'Modell', '1', 'n')
+        g.add_relation('Hersteller', 'baut', 'Modell', '1', 'n')
+        source = g.get_graphViz().source
+        # node attributes are only written when they change, each style once per run of objects
+        self.assertEqual(5, source.count('node ['))
+        self.assertIn('node [peripheries=2]', source)
+        self.assertEqual(1, source.count('arrowhead=none'))
+        self.assertIn('edge [arrowhead=none]', source)
+        # rebuilding starts with no node attributes in effect
+        g.add_node('Teil')
+        self.assertEqual(6, g.get_graphViz().source.count('node ['))
+
+    def testConcurrentGraphViz(self):
+        '''
+        threads building the rendering of the same diagram get the same DOT as a single thread
+        '''
+        def getDiagram():
+            g = ER()
+            for i in range(100):
+                g.add_attribute(f'Entity{i}', 'Name', isPK = True, isMultiple = i % 3 == 0)
+                g.add_relation(f'Entity{i}', f'relation{i}', f'Entity{(i + 1) % 100}', '1', 'n', isWeak = i % 2 == 0)
+                g.add_is_a(f'Entity{i}', [f'Sub{i}'], superLabel = 'p')
+            return g
+        threads = 4
+        for _ in range(5):
+            g = getDiagram()
+            expected = g.clone().get_graphViz().source
+            barrier = threading.Barrier(threads)
+            def build(_):
+                barrier.wait()
+                return g.get_graphViz().source
+            with ThreadPoolExecutor(max_workers = threads) as executor:
+                sources = list(executor.map(build, range(threads)))
+            for source in sources:
+                self.assertEqual(expected, source)
@@ -0,0 +1,42 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+import subprocess
+import sys
+
+class TestImportTime(Basetest):
+    '''
+      test that importing the package stays lean
+    '''
+
+    # modules only needed for rendering, displaying and similarity calls
+    DEFERRED_MODULES = ['IPython', 'graphviz', 'excmanager', 'numpy']
+
+    def runFresh(self, code):
+        '''
+        run the code in a fresh interpreter
+        Returns:
+            str: the output of the code
+        '''
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        return result.stdout
+
+    def testDeferredImports(self):
+        code = f'''
+import sys
+import time
+start = time.perf_counter()
+import erdiagram.ER, erdiagram.Grading
+elapsed = time.perf_counter() - start
+er = erdiagram.ER.ER()
+er.add_node("Person")
+print([m for m in {self.DEFERRED_MODULES!r} if m in sys.modules])
+print(elapsed)
+'''
+        loaded, elapsed = self.runFresh(code).splitlines()
+        self.assertEqual("[]", loaded)
+        # only reported, the deferred modules are the check
+        print(f"import erdiagram.ER, erdiagram.Grading took {float(elapsed)*1000:.0f} ms")
@@ -0,0 +1,78 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+from erdiagram.LabelIndex import LabelIndex
+from erdiagram.NodeType import NodeType
+from erdiagram.Similarity import Similarity
+from excmanager.Util import Util
+from unittest import skipUnless
+import random
+
+class TestLabelIndex(Basetest):
+    '''
+      test the label index behind ER.get_obj
+    '''
+
+    def testCandidateLengths(self):
+        lengths = LabelIndex.candidate_lengths(10, LabelIndex.FUZZY_THRESHOLD)
+        self.assertEqual(range(9, 12), lengths)
+        self.assertEqual(range(0, 1), LabelIndex.candidate_lengths(0, LabelIndex.FUZZY_THRESHOLD))
+
+    def testFuzzyMatchesLinearScan(self):
+        '''
+            the length prefilter must not change the first fuzzy match
+        '''
+        rnd = random.Random(42)
+        alphabet = 'abcäöüABC '
+        index = LabelIndex()
+        labels = []
+        for i in range(1000):
+            label = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 12)))
+            if index.get_type(label) is None:
+                index.add(label, str(NodeType.NODE))
+                labels.append(label)
+        for i in range(500):
+            label = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 12)))
+            if index.get_type(label) is not None:
+                continue
+            expected = None
+            for candidate in labels:
+                if Util.levenshtein_str_callback(candidate, label) >= LabelIndex.FUZZY_THRESHOLD:
+                    expected = candidate
+                    break
+            self.assertEqual(expected, index.find(label, str(NodeType.NODE)))
+
+    def testTypeChange(self):
+        index = LabelIndex()
+        index.add("A.B", str(NodeType.NODE))
+        index.add("A.B", str(NodeType.ATTRIBUTE))
+        self.assertEqual([], index.get_labels(str(NodeType.NODE)))
+        self.assertEqual("A.B", index.find("A.B", str(NodeType.ATTRIBUTE)))
+        self.assertIsNone(index.find("A.B", str(NodeType.NODE)))
+
+    def testPrefixedMatchesLinearScan(self):
+        index = LabelIndex()
+        labels = ["B.x", "A", "A.b", "AB.c", "A.a", "A.a.1", "A.", "B.isA.['A']", "A.z"]
+        for label in labels:
+            index.add(label, str(NodeType.ATTRIBUTE) if "." in label else str(NodeType.NODE))
+        for prefix in ["A.", "B.", "A.a.", "C.", "AB."]:
+            expected = [label for label in labels if label.startswith(prefix)]
+            self.assertEqual(expected, index.get_prefixed(prefix))
+        self.assertEqual(["A.b", "A.a", "A.a.1", "A.", "A.z"], index.get_prefixed("A.", str(NodeType.ATTRIBUTE)))
+        self.assertEqual([], index.get_prefixed("A.", str(NodeType.NODE)))
+
+    @skipUnless(Similarity.has_matrix(), "numpy is not installed")
+    def testFindManyMatchesFind(self):
+        rnd = random.Random(11)
+        alphabet = 'abcäöüABC .'
+        index = LabelIndex()
+        for i in range(400):
+            label = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 12)))
+            index.add(label, str(NodeType.NODE) if i % 3 else str(NodeType.ATTRIBUTE))
+        labels = [''.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 12))) for i in range(300)]
+        for nodeType in [str(NodeType.NODE), None]:
+            expected = [index.find(label, nodeType) for label in labels]
+            self.assertEqual(expected, index.find_many(labels, nodeType))
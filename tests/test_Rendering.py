@@ -0,0 +1,122 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+from erdiagram.Rendering import render_many, RenderCache
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+class TestRendering(Basetest):
+    '''
+      test rendering many diagrams to files
+    '''
+
+    @unittest.skipUnless(shutil.which("dot"), "graphviz is not installed")
+    def testRenderMany(self):
+        diagrams = list(self.getExampleDiagrams(4))
+        diagrams[1].engine = 'neato'
+        named = [(f"diagram{i}", g) for i, g in enumerate(diagrams)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = render_many(named, format='svg', out_dir=tmpdir, workers=2)
+            self.assertEqual([None] * 4, [result.error for result in results])
+            self.assertEqual([os.path.join(tmpdir, f"diagram{i}.svg") for i in range(4)], [result.path for result in results])
+            for result in results:
+                with open(result.path) as f:
+                    self.assertIn("<svg", f.read())
+
+    def testRenderFailures(self):
+        diagrams = list(self.getExampleDiagrams(3))
+        diagrams[1].engine = 'no-such-engine'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = render_many(diagrams, out_dir=tmpdir, workers=2, timeout=30)
+            self.assertEqual(3, len(results))
+            self.assertIsNone(results[1].path)
+            self.assertIsNotNone(results[1].error)
+            if shutil.which("dot"):
+                self.assertEqual(os.path.join(tmpdir, "2.svg"), results[2].path)
+
+    def testSourceInCallingThread(self):
+        '''
+        the DOT of the diagrams is generated by the calling thread, the workers only run graphviz
+        '''
+        unique = list(self.getExampleDiagrams(2))
+        diagrams = unique * 2
+        threads = []
+        for g in unique:
+            getGraphViz = g.get_graphViz
+            def recordingGetGraphViz(getGraphViz=getGraphViz):
+                threads.append(threading.current_thread())
+                return getGraphViz()
+            g.get_graphViz = recordingGetGraphViz
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = RenderCache(os.path.join(tmpdir, 'cache'))
+            for cache in [None, cache]:
+                threads.clear()
+                results = render_many(diagrams, out_dir=tmpdir, workers=2, cache=cache)
+                self.assertEqual(4, len(results))
+                self.assertEqual([threading.current_thread()] * 4, threads)
+
+    @unittest.skipUnless(shutil.which("dot"), "graphviz is not installed")
+    def testRenderCache(self):
+        diagrams = list(self.getExampleDiagrams(2)) * 2
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = RenderCache(os.path.join(tmpdir, 'cache'))
+            results = render_many(diagrams, out_dir=os.path.join(tmpdir, 'out'), workers=2, cache=cache)
+            self.assertEqual([None] * 4, [result.error for result in results])
+            self.assertEqual(2, len(cache.files))
+            path = cache.render(diagrams[0])
+            self.assertEqual(cache.key(diagrams[0].get_graphViz().source, 'dot', 'svg') + '.svg', os.path.basename(path))
+            # another engine or format is another rendering
+            diagrams[1].engine = 'neato'
+            cache.render(diagrams[1])
+            self.assertEqual(3, len(cache.files))
+
+    def testRenderCacheEviction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            now = time.time()
+            sources = ['digraph { a }', 'digraph { b }', 'digraph { c }']
+            names = [RenderCache.key(source, 'dot', 'svg') + '.svg' for source in sources]
+            for i, name in enumerate(names):
+                with open(os.path.join(tmpdir, name), 'w') as f:
+                    f.write('x' * 100)
+                os.utime(os.path.join(tmpdir, name), (now - 100 + i, now - 100 + i))
+            cache = RenderCache(tmpdir, maxBytes=250)
+            self.assertEqual(names, list(cache.files))
+            self.assertEqual(300, cache.size)
+            # a hit makes a file the most recently used
+            self.assertEqual(os.path.join(tmpdir, names[0]), cache.get(sources[0], 'dot', 'svg'))
+            self.assertIsNone(cache.get(sources[0], 'neato', 'svg'))
+            cache.evict()
+            self.assertEqual([names[2], names[0]], list(cache.files))
+            self.assertEqual(sorted([names[0], names[2]]), sorted(os.listdir(tmpdir)))
+            # the order of use is kept on disk
+            self.assertEqual([names[2], names[0]], list(RenderCache(tmpdir).files))
+            # a copy made by the cache survives the eviction of the cached file
+            target = os.path.join(tmpdir, 'copy.svg')
+            self.assertIsNotNone(cache.get(sources[2], 'dot', 'svg', target))
+            cache.maxBytes = 50
+            cache.evict()
+            self.assertEqual([names[2]], list(cache.files))
+            with open(target) as f:
+                self.assertEqual('x' * 100, f.read())
+
+    def testRenderCacheSource(self):
+        '''
+        a DOT source given by the caller is the key of the cache, the diagram is not asked for it
+        '''
+        g = next(self.getExampleDiagrams(1))
+        source = g.get_graphViz().source
+        with tempfile.TemporaryDirectory() as tmpdir:
+            name = RenderCache.key(source, 'dot', 'svg') + '.svg'
+            with open(os.path.join(tmpdir, name), 'w') as f:
+                f.write('<svg/>')
+            cache = RenderCache(tmpdir)
+            # a hit, graphviz is not needed
+            g.add_node('Teil')
+            self.assertEqual(os.path.join(tmpdir, name), cache.render(g, source=source))
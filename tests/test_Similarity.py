@@ -0,0 +1,44 @@
+'''
+Created on 2026-10-17
+
+@author: ms
+'''
+from tests.basetest import Basetest
+from erdiagram.Similarity import Similarity
+from excmanager.Util import Util
+from unittest import skipUnless
+import random
+
+class TestSimilarity(Basetest):
+    '''
+      test the memoized label similarity
+    '''
+
+    def testIsSimilarMatchesRatio(self):
+        rnd = random.Random(7)
+        alphabet = 'abäöAB _'
+        values = [True, False, "", "true"]
+        values += [''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 10))) for i in range(150)]
+        for a in values:
+            for b in values:
+                ratio = Util.levenshtein_str_callback(a, b)
+                for threshold in [0.5, 0.8, 0.92]:
+                    self.assertEqual(ratio >= threshold, Similarity.is_similar(a, b, threshold), (a, b, threshold))
+                    self.assertEqual(ratio > threshold, Similarity.is_similar(a, b, threshold, strict=True), (a, b, threshold))
+
+    def testRatioMemoized(self):
+        Similarity.cache_clear()
+        self.assertEqual(Util.levenshtein_str_callback("Bewertung", "Bewertungs"), Similarity.ratio("Bewertung", "Bewertungs"))
+        Similarity.ratio("Bewertungs", "Bewertung")
+        self.assertEqual(1, Similarity.cache_info().hits)
+        self.assertEqual(1, Similarity.cache_info().misses)
+
+    @skipUnless(Similarity.has_matrix(), "numpy is not installed")
+    def testMatrix(self):
+        labels = ["Bewertung", "Schüler", "", "Hersteller.Adresse.Straße + Nr." * 3]
+        otherLabels = ["Bewertungs", "Schueler", "", "x", "Hersteller.Adresse.Straße + Nr." * 3]
+        ratios = Similarity.matrix(labels, otherLabels)
+        self.assertEqual((len(labels), len(otherLabels)), ratios.shape)
+        for i, label in enumerate(labels):
+            for j, otherLabel in enumerate(otherLabels):
+                self.assertAlmostEqual(Util.levenshtein_str_callback(label, otherLabel), ratios[i, j])